@@ -1,4 +1,18 @@
+import sys
+import weakref
+from collections import OrderedDict
 from enum import Enum
+from oomphnum import Array
+from oomphrope import Rope, add
+
+
+def where(node):
+    """
+    Returns ' at line l, column c' for where node is in its program, or '' if that is not known
+    """
+    if node is None or node.line is None:
+        return ''
+    return f" at line {node.line}, column {node.column}"
 
 
 class UnboundVariable(Exception):
@@ -6,8 +20,12 @@ class UnboundVariable(Exception):
     Exception raised when variable is not found
     """
 
-    def __init__(self, var):
-        self.message = "Variable {} not found".format(var)
+    def __init__(self, var, node=None):
+        super().__init__(var)
+        self.message = "Variable {} not found".format(var) + where(node)
+
+    def __str__(self):
+        return self.message
 
 
 class NotAFunction(Exception):
@@ -15,10 +33,137 @@ class NotAFunction(Exception):
     Exception raised when a non function value is applied as a function
     """
     def __init__(self, exp):
-        self.message = f"Application of a non function: {exp}"
+        self.message = f"Application of a non function: {exp}" + where(exp)
+
+    def __str__(self):
+        return self.message
+
+
+class BreakLoop(Exception):
+    """
+    Exception raised by break, caught by the innermost enclosing loop
+    """
+
+
+class ContinueLoop(Exception):
+    """
+    Exception raised by continue, caught by the innermost enclosing loop
+    """
+
+
+class LoopControlError(Exception):
+    """
+    Exception raised when break or continue is used outside of a loop
+    """
+    def __init__(self, exp):
+        self.message = f"'{exp}' outside of a loop" + where(exp)
+
+    def __str__(self):
+        return self.message
+
+
+def checkLoops(expr):
+    """
+    Raises a LoopControlError if expr uses break or continue outside of a loop
+
+    Functions and classes start a new scope, so a loop around their
+    definition does not count.
+    """
+    todo = [(expr, False)]
+    while todo:
+        e, inLoop = todo.pop()
+        if isinstance(e, (Break, Continue)) and not inLoop:
+            raise LoopControlError(e)
+        if isinstance(e, (Function, AnonFunction, Class)):
+            inLoop = False
+        for child in e.children():
+            todo.append((child, inLoop or (isinstance(e, (While, For)) and child is e.loop)))
+
+
+def statements(expr):
+    """
+    Returns the commands of expr in order, those of the Blocks in it if it is a Block
+    """
+    stmts, todo = [], [expr]
+    while todo:
+        c = todo.pop()
+        if type(c) == Block:
+            todo.extend(reversed(c.body))
+        else:
+            stmts.append(c)
+    return stmts
+
+
+def sequence(first, then):
+    """
+    Returns the Block running first and then then, adding to first rather than nesting it if it is a Block
+    """
+    block = first if type(first) == Block else Block([first])
+    block.body.extend(then.body if type(then) == Block else [then])
+    return block
+
+
+def scopeNames(expr, names=()):
+    """
+    Returns a list of the variable names expr may use, in order of first use
+
+    Names used by a function defined in expr count, since making its closure
+    copies them out of the environment, and so do names used by the
+    constructor of a class, which are copied out of it when the class is
+    defined, but names used by the other members of a class do not, since
+    members are evaluated on their own. super is always
+    included, since method calls read it from the environment of the caller.
+
+    Parameter names: names to start the list with
+    """
+    used = dict.fromkeys(['super', *names])
+    todo = [expr]
+    while todo:
+        e = todo.pop()
+        if isinstance(e, Var):
+            used[e.name] = None
+        elif isinstance(e, Dot):
+            # The attribute is not a variable
+            todo.append(e.obj)
+        elif isinstance(e, (Function, AnonFunction)):
+            if isinstance(e, Function):
+                used[e.name.name] = None
+            used.update(dict.fromkeys(e.capturedNames()))
+        elif isinstance(e, Class):
+            used[e.name.name] = None
+            used.update(dict.fromkeys(e.capturedNames()))
+            if e.superClass is not None:
+                used[e.superClass.name] = None
+        else:
+            todo.extend(reversed(e.children()))
+    return list(used)
+
+
+# The types of the values that can be indexed, sliced and looped over
+INDEXABLE = (str, list, tuple, dict, Array, Rope)
+SLICEABLE = (str, list, tuple, Array, Rope)
+ITERABLE = (str, list, tuple, dict, Array, Rope)
+
+
+def iterate(value):
+    """
+    Returns an iterator over the elements of a string, list or tuple, or the keys of a dictionary, as a for loop uses
+    """
+    assert type(value) in ITERABLE, 'Can only loop over a string, list, tuple, dictionary or array'
+    return iter(value)
+
+
+def capture(env, names):
+    """
+    Returns the bindings of env that a closure using names needs
+    """
+    return {k: env[k] for k in names if k in env}
 
 
 class Closure:
+    # The Memo of a closure of a pure function, whose results are cached
+    memo = None
+
     def __init__(self, expr, args, env):
         assert isinstance(expr, Expr)
         for a in args:
@@ -35,24 +180,216 @@ class Closure:
         """
         return MethodClosure(self.expr, self.args, self.env, obj, obj.superClass)
 
+    def callEnv(self, vals, env):
+        """
+        Returns the environment the body of this closure is evaluated in
+
+        Parameter vals: the values of the arguments, in order
+        Parameter env: the environment of the caller
+        """
+        env2 = {k.name: v for (k, v) in zip(self.args, vals)}
+        return {**env2, **self.env}
+
+    def methodEnv(self, obj, vals, env):
+        """
+        Returns the environment the body of this closure is evaluated in when it is called as a method
+
+        Parameter obj: the object (or PrivateObject) the method was looked up on
+        Parameter vals: the values of the arguments, starting with the object for "this"
+        Parameter env: the environment of the caller
+        """
+        env2 = {k.name: v for (k, v) in zip(self.args, vals)}
+        env2['this'] = PrivateObject.of(env2['this'])
+        if 'super' in env:
+            superClass = env['super'][1].superClass if env['super'][1] else None
+        else:
+            superClass = obj.superClass
+        env2['super'] = (obj, superClass)
+        return {**env2, **self.env}
+
     def __str__(self):
         return f"[| {list(map(str, self.args))}, {self.expr}, {self.env}|]"
 
 
+class TailCall(tuple):
+    """
+    A call in tail position, returned to the App evaluating the enclosing call
+    so that the callee's body runs in that App's Python frame, not a new one
+
+    It is the pair (body, env) of the callee's body and the environment to evaluate it in.
+    """
+
+
+def complete(value):
+    """
+    Returns value, after evaluating the calls it stands for if it is a TailCall
+    """
+    while type(value) == TailCall:
+        body, env = value
+        value = body.tail(env)
+    return value
+
+
+def applyFunction(function, vals):
+    """
+    Returns the value of calling the OOMPH function value function from Python, as a builtin does with a key or predicate
+
+    Parameter vals: the values of the arguments, in order
+    """
+    if type(function) == Builtin:
+        return function.function(*vals)
+    if isinstance(function, MethodClosure):
+        # Leave room for "this"
+        if len(function.args) != len(vals) + 1:
+            raise TypeError("Number of arguments does not match number of parameters")
+        vals = [function.obj.eval({})[0]] + list(vals)
+        return complete(function.expr.tail(function.methodEnv(function.obj, vals, {})))
+    if isinstance(function, Closure):
+        if len(function.args) != len(vals):
+            raise TypeError("Number of arguments does not match number of parameters")
+        if function.memo is not None:
+            return function.memo.call(vals, lambda: complete(function.expr.tail(function.callEnv(vals, {}))))
+        return complete(function.expr.tail(function.callEnv(vals, {})))
+    raise TypeError(f"Application of a non function: {function!r}")
+
+
+def memoKey(value):
+    """
+    Returns a key standing for value in a Memo, or None if value can change or be told apart
+    from an equal value, like a list, a dictionary, an object or a closure
+    """
+    kind = type(value)
+    if kind == tuple:
+        keys = tuple(memoKey(v) for v in value)
+        return None if None in keys else (kind, keys)
+    if kind in (int, str, bool) or value is None:
+        # Typed, so that 1 and true are different keys
+        return kind, value
+    if kind == Rope:
+        # The same key as the string it stands for
+        return str, str(value)
+    return None
+
+
+# What Memo.get returns for arguments whose result is not cached
+NOT_CACHED = object()
+
+
+class Builtin:
+    """
+    A function of the interpreter itself, which a call runs directly as Python with the values of its arguments
+    """
+    __slots__ = ('name', 'function')
+
+    def __init__(self, name, function):
+        self.name = name
+        self.function = function
+
+    def __repr__(self):
+        return f"<builtin {self.name}>"
+
+
+class Memo:
+    """
+    The results of a pure function, keyed on the values of its arguments
+
+    Only the maxSize most recently used results are kept. Method calls are
+    never cached, since one of their arguments is always an object.
+    """
+    # The size of new Memos, which main.py --memo-size sets
+    maxSize = 1024
+
+    # Every Memo in use, for reporting statistics
+    live = weakref.WeakSet()
+
+    def __init__(self, name):
+        self.name = name
+        self.maxSize = Memo.maxSize
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.uncached = 0
+        Memo.live.add(self)
+
+    def key(self, vals):
+        """
+        Returns the key results for the arguments vals are cached under, None if they are not cached
+        """
+        key = memoKey(tuple(vals))
+        if key is None or self.maxSize <= 0:
+            self.uncached += 1
+            return None
+        return key
+
+    def get(self, key):
+        """
+        Returns the result cached under key, or NOT_CACHED
+        """
+        results = self.results
+        if key in results:
+            self.hits += 1
+            results.move_to_end(key)
+            return results[key]
+        self.misses += 1
+        return NOT_CACHED
+
+    def store(self, key, value):
+        results = self.results
+        results[key] = value
+        if len(results) > self.maxSize:
+            results.popitem(last=False)
+            self.evictions += 1
+
+    def call(self, vals, compute):
+        """
+        Returns the result for the arguments vals, calling compute for it if it is not cached
+        """
+        key = self.key(vals)
+        if key is None:
+            return compute()
+        value = self.get(key)
+        if value is NOT_CACHED:
+            value = compute()
+            self.store(key, value)
+        return value
+
+    def __str__(self):
+        return (f"{self.name}: {len(self.results)}/{self.maxSize} cached, {self.hits} hits, {self.misses} misses, "
+                f"{self.evictions} evictions, {self.uncached} uncached calls")
+
+
 class MethodClosure(Closure):
     def __init__(self, expr, args, env, obj, superClass):
         super().__init__(expr, args, env)
         self.obj = obj
         self.superClass = superClass
 
+    def callEnv(self, vals, env):
+        return self.methodEnv(self.obj, vals, env)
+
+
+class Unresolvable:
+    """
+    A member lookup that fails, kept so that the same exception can be raised again
+    """
+    def __init__(self, error):
+        self.type = type(error)
+        self.args = error.args
+
+    def fail(self):
+        raise self.type(*self.args)
+
 
 class ClassInfo:
-    def __init__(self, name, classVars, methods, superClass):
+    def __init__(self, name, classVars, methods, superClass, outer=None):
         """
         Parameter name: the name of this class (a string)
         Parameter classVars: a dictionary mapping variable names to values
         Parameter methods: a dictionary mapping method names to their closures
         Parameter superClass: a string, the name of the superclass of this class, None if there is no superclass
+        Parameter outer: the bindings the constructor uses in the environment the class was defined in,
+            as they were when it was defined, or None
         """
         assert type(name) == str, "Class name must be a string"
         assert isinstance(classVars, dict), "Invalid class variable"
@@ -63,22 +400,89 @@ class ClassInfo:
         self.methods = methods
         self.constructor = methods.get("constructor", None)
         self.superClass = superClass
+        self.outer = outer if outer is not None else {}
+        # Bumped whenever a class variable of this class is assigned, so member tables know to be rebuilt
+        self.epoch = 0
+        self.table = None
+        self.tableEpoch = None
+        self.members()
 
     def __getitem__(self, key):
         """
         Note that methods will shadow class variables because of this
         """
+        table = self.members()
+        if table is None:
+            return self.resolve(key)
+        entry = table.get(key)
+        if entry is None:
+            raise AttributeError(key)
+        if type(entry) == Unresolvable:
+            entry.fail()
+        return entry
+
+    def resolve(self, key):
+        """
+        Looks key up by walking the superclass chain, returning the same as self[key]
+        """
         if key in self.methods:
             return self.methods[key], AttrOwner.THIS
         if key in self.classVars:
             return self.classVars[key], AttrOwner.THIS
         if self.superClass is not None:
-            (val, access), owner = self.superClass[key]
-            if access == PrivacyMod.PRIVATE:
-                raise TypeError("Subclass can not access private fields of superclass!")
-            return (val, access), AttrOwner.SUPER
+            return self.inherit(self.superClass[key])
         raise AttributeError(key)
 
+    def inherit(self, entry):
+        """
+        Returns what looking up a member of the superclass gives on this class
+
+        Parameter entry: the superclass's (value, owner) pair for the member
+        """
+        (val, access), owner = entry
+        if access == PrivacyMod.PRIVATE:
+            raise TypeError("Subclass can not access private fields of superclass!")
+        return (val, access), AttrOwner.SUPER
+
+    def members(self):
+        """
+        Returns a dictionary mapping the name of every member of this class,
+        including inherited ones, to self[name] or to the Unresolvable raised by it
+
+        Returns None when the superclass chain has an object in it, since its
+        attributes can change without a class variable being assigned
+        """
+        epoch = self.version()
+        if self.tableEpoch != epoch:
+            self.table = self.flatten()
+            self.tableEpoch = epoch
+        return self.table
+
+    def version(self):
+        """
+        Returns how many times a class variable of this class or of one of its superclasses has been assigned
+        """
+        if isinstance(self.superClass, ClassInfo):
+            return self.epoch + self.superClass.version()
+        return self.epoch
+
+    def flatten(self):
+        table = {}
+        if self.superClass is not None:
+            if isinstance(self.superClass, Object):
+                return None
+            inherited = self.superClass.members()
+            if inherited is None:
+                return None
+            for key, entry in inherited.items():
+                try:
+                    table[key] = entry if type(entry) == Unresolvable else self.inherit(entry)
+                except Exception as e:
+                    table[key] = Unresolvable(e)
+        table.update((k, (v, AttrOwner.THIS)) for k, v in self.classVars.items())
+        table.update((k, (v, AttrOwner.THIS)) for k, v in self.methods.items())
+        return table
+
     def get_owned(self, key, owner):
         if key in self.methods:
             return self.methods[key]
@@ -93,37 +497,125 @@ class ClassInfo:
 
     def __setitem__(self, key, value):
         self.classVars[key] = value
+        self.epoch += 1
 
     def __call__(self, args, env):
-        return Object(self.name, self.classVars, self.methods, args, self.superClass, env)
+        obj = Object(self)
+        obj.construct(args, env)
+        return obj
+
+
+class Shape:
+    """
+    The layout of the attributes of an object
+
+    Objects that were given the same attributes in the same order share a
+    shape, and keep the attribute values in a list indexed by the slots here
+    """
+    def __init__(self, slots):
+        """
+        Parameter slots: a dictionary mapping attribute names to their index in the value list
+        """
+        self.slots = slots
+        # Maps an attribute name to the shape reached by adding it
+        self.transitions = {}
+
+    def add(self, key):
+        """
+        Returns the shape of an object with this shape once attribute key is added
+        """
+        shape = self.transitions.get(key)
+        if shape is None:
+            shape = Shape({**self.slots, key: len(self.slots)})
+            self.transitions[key] = shape
+        return shape
+
+
+# The shape of an object with no attributes, from which every other shape is reached
+EMPTY_SHAPE = Shape({})
 
 
 class Object(ClassInfo):
-    def __init__(self, name, classVars, methods, args, superClass, env):
-        super().__init__(name, classVars, methods, superClass)
-        self.args = args  # store to make PrivateObject
-        self.attributes = {}
+    def __init__(self, classInfo):
+        """
+        Parameter classInfo: the class of this object, or another object of that class
+        """
+        self.cls = classInfo.cls if isinstance(classInfo, Object) else classInfo
+        self.shape = EMPTY_SHAPE
+        self.values = []
+        # The PrivateObject bound to "this" in methods of this object, made on the first call
+        self.private = None
+
+    # An object looks up everything but its attributes in its class
+    name = property(lambda self: self.cls.name)
+    classVars = property(lambda self: self.cls.classVars)
+    methods = property(lambda self: self.cls.methods)
+    constructor = property(lambda self: self.cls.constructor)
+    superClass = property(lambda self: self.cls.superClass)
+
+    @property
+    def attributes(self):
+        """
+        A dictionary mapping the names of the attributes of this object to their values
+        """
+        return {key: self.values[slot] for key, slot in self.shape.slots.items()}
+
+    def adopt(self, this):
+        """
+        Takes the attributes of this, the value a constructor body left bound to "this"
+        """
+        self.shape, self.values = this.shape, this.values
+
+    def members(self):
+        return self.cls.members()
+
+    def construct(self, args, env):
+        """
+        Runs the constructor of this object, if it has one
+
+        Parameter args: the argument expressions of the constructor call
+        Parameter env: the environment of the caller
+        """
         if self.constructor:
-            # Insert self for "this" in constructor call
-            args.insert(0, self)
-            constructor = self.constructor[0] if type(self.constructor) == tuple else self.constructor
-            if len(constructor.args) != len(args):
+            constructor = self.constructorClosure()
+            # Leave room for "this" in constructor call
+            if len(constructor.args) != len(args) + 1:
                 raise TypeError("Invalid number of arguments for constructor call")
-            env2 = {k.name: v.eval(env)[0] for (k, v) in zip(constructor.args, args)}
-            env2['this'] = PrivateObject(env2['this'])
-            # Bind super to a pair, this and the superclass
-            _, newEnv = constructor.expr.eval({**env, **env2, 'super': (self, superClass)})
-            self.attributes = newEnv['this'].attributes
+            vals = [self] + [v.eval(env)[0] for v in args]
+            _, newEnv = constructor.expr.eval(self.constructorEnv(vals, env))
+            self.adopt(newEnv['this'])
         elif len(args) > 0:
             raise TypeError("Constructor takes no arguments")
 
+    def constructorClosure(self):
+        return self.constructor[0] if type(self.constructor) == tuple else self.constructor
+
+    def constructorEnv(self, vals, env):
+        """
+        Returns the environment the constructor body is evaluated in
+
+        Parameter vals: the values of the arguments, starting with this object
+        Parameter env: the environment of the caller
+        """
+        env2 = {k.name: v for (k, v) in zip(self.constructorClosure().args, vals)}
+        env2['this'] = PrivateObject.of(env2['this'])
+        # Variables the caller does not have are those where the class was defined
+        # Bind super to a pair, this and the superclass
+        return {**self.cls.outer, **env, **env2, 'super': (self, self.superClass)}
+
     def __getitem__(self, key):
-        if key in self.attributes:
-            return self.attributes[key]
+        slot = self.shape.slots.get(key)
+        if slot is not None:
+            return self.values[slot]
         return super().__getitem__(key)
 
     def __setitem__(self, key, value):
-        self.attributes[key] = value
+        slot = self.shape.slots.get(key)
+        if slot is None:
+            self.shape = self.shape.add(key)
+            self.values.append(value)
+        else:
+            self.values[slot] = value
 
     def eval(self, env):
         return self, env
@@ -136,12 +628,28 @@ class PrivateObject:
     def __init__(self, obj):
         assert isinstance(obj, Object), "From_object expects an object"
         self.obj = obj
-        self.attributes = obj.attributes
         self.superClass = obj.superClass
 
+    @classmethod
+    def of(cls, obj):
+        """
+        Returns the PrivateObject for obj, which is shared by every method call on it
+        """
+        assert isinstance(obj, Object), "From_object expects an object"
+        if obj.private is None:
+            obj.private = PrivateObject(obj)
+        return obj.private
+
+    shape = property(lambda self: self.obj.shape)
+    values = property(lambda self: self.obj.values)
+    attributes = property(lambda self: self.obj.attributes)
+
     def __getitem__(self, key):
         return self.obj.__getitem__(key)
 
+    def members(self):
+        return self.obj.members()
+
     def __setitem__(self, key, value):
         self.obj.__setitem__(key, value)
 
@@ -170,6 +678,17 @@ class AttrOwner(Enum):
 
 
 class Expr:
+    # Nodes have no __dict__, so every attribute a kind of node has is listed in its __slots__.
+    # line and column are where the expression starts in its program, both counted from 1, or None if it was not parsed
+    __slots__ = ('line', 'column')
+    # Names of the attributes holding the subexpressions of this expression
+    fields = ()
+
+    def __new__(cls, *args, **kwargs):
+        node = super().__new__(cls)
+        node.line = node.column = None
+        return node
+
     def eval(self, env):
         """
         The configuration returned by eval is a tuple with elements
@@ -181,8 +700,41 @@ class Expr:
         """
         return None, None
 
+    def tail(self, env):
+        """
+        Returns the value of this expression, which is the last thing a function body evaluates,
+        or the TailCall that computes it
+        """
+        return self.eval(env)[0]
+
+    def locate(self, other):
+        """
+        Returns this expression, after giving it the position of other if it has none
+        """
+        if self.line is None and other.line is not None:
+            self.line = other.line
+            self.column = other.column
+        return self
+
+    def children(self):
+        """
+        Returns a list of the subexpressions of this expression, in order
+        """
+        children = []
+        for field in self.fields:
+            todo = [getattr(self, field)]
+            while todo:
+                e = todo.pop(0)
+                if isinstance(e, Expr):
+                    children.append(e)
+                elif isinstance(e, (list, tuple)):
+                    todo[:0] = e
+        return children
+
 
 class Int(Expr):
+    __slots__ = ('value',)
+
     def __init__(self, val):
         assert type(val) == int
         self.value = val
@@ -202,6 +754,9 @@ class Int(Expr):
         return hash(self.value)
 
 class List(Expr):
+    __slots__ = ('value',)
+    fields = ('value',)
+
     def __init__(self, val):
         assert type(val) == list
         self.value = val
@@ -216,6 +771,9 @@ class List(Expr):
 
 
 class Tuple(Expr):
+    __slots__ = ('value',)
+    fields = ('value',)
+
     def __init__(self, val):
         assert type(val) == tuple
         self.value = val
@@ -232,6 +790,9 @@ class Tuple(Expr):
         return hash(self.value)
 
 class Dict(Expr):
+    __slots__ = ('keyvals',)
+    fields = ('keyvals',)
+
     def __init__(self, keyvals):
         self.keyvals = keyvals
 
@@ -239,9 +800,11 @@ class Dict(Expr):
         return {k.eval(env)[0] : v.eval(env)[0] for k, v in self.keyvals}, env
 
 class String(Expr):
+    __slots__ = ('value',)
+
     def __init__(self, val):
         assert type(val) == str
-        self.value = val
+        self.value = sys.intern(val)
 
     def eval(self, env):
         return self.value, env
@@ -258,7 +821,36 @@ class String(Expr):
         return hash(self.value)
 
 
+class Const(Expr):
+    """
+    An immutable value worked out before the program runs, by oomphoptimize
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, val):
+        self.value = val
+
+    def eval(self, env):
+        return self.value, env
+
+    def __str__(self):
+        return repr(self.value)
+
+
+class ConstCopy(Const):
+    """
+    A list or dictionary of constants, copied every time since the program may change it
+    """
+    __slots__ = ()
+
+    def eval(self, env):
+        return self.value.copy(), env
+
+
 class Index(Expr):
+    __slots__ = ('obj', 'ind')
+    fields = ('obj', 'ind')
+
     def __init__(self, obj, ind):
         assert isinstance(obj, Expr)
         assert isinstance(ind, Expr)
@@ -268,11 +860,14 @@ class Index(Expr):
     def eval(self, env):
         obj, _ = self.obj.eval(env)
         ind, _ = self.ind.eval(env)
-        assert type(obj) in [str, list, tuple, dict], 'Can only index a string or list'
+        assert type(obj) in INDEXABLE, 'Can only index a string or list'
         return obj[ind], env
 
 
 class Slice(Expr):
+    __slots__ = ('obj', 'start', 'end')
+    fields = ('obj', 'start', 'end')
+
     def __init__(self, obj, start, end):
         assert isinstance(obj, Expr)
         assert isinstance(start, Expr) or start is None
@@ -291,7 +886,7 @@ class Slice(Expr):
             end, _ = self.end.eval(env)
         else:
             end = None
-        assert type(obj) in [str, list, tuple], 'Not a sliceable item'
+        assert type(obj) in SLICEABLE, 'Not a sliceable item'
         assert (type(start) == int or start is None) and (type(end) == int or end is None), "Slice indices must be integers"
         if start is not None and end is not None:
             return obj[start:end], env
@@ -302,7 +897,27 @@ class Slice(Expr):
         return obj[:], env
 
 
-class BTrue(Expr):
+class Singleton(Expr):
+    """
+    A kind of expression with nothing in it, like true or skip, of which only one node is ever made
+
+    A program uses the same node everywhere it has one, so the node has no position:
+    setting its line or column does nothing.
+    """
+    __slots__ = ()
+    line = property(lambda self: None, lambda self, value: None)
+    column = property(lambda self: None, lambda self, value: None)
+
+    def __new__(cls):
+        node = cls.__dict__.get('instance')
+        if node is None:
+            node = cls.instance = object.__new__(cls)
+        return node
+
+
+class BTrue(Singleton):
+    __slots__ = ()
+
     def eval(self, env):
         return True, env
 
@@ -316,7 +931,9 @@ class BTrue(Expr):
         return hash(True)
 
 
-class BFalse(Expr):
+class BFalse(Singleton):
+    __slots__ = ()
+
     def eval(self, env):
         return False, env
 
@@ -331,21 +948,30 @@ class BFalse(Expr):
 
 
 class Var(Expr):
+    __slots__ = ('name',)
+
     def __init__(self, var):
         assert isinstance(var, str), f"{var} is not a valid variable name"
-        self.name = var
+        # Every use of a name shares one string
+        self.name = sys.intern(var)
 
     def eval(self, env):
         try:
             return env[self.name], env
         except KeyError:
-            raise UnboundVariable(self.name)
+            builtin = BUILTINS.get(self.name)
+            if builtin is None:
+                raise UnboundVariable(self.name, self)
+            return builtin, env
 
     def __str__(self):
         return str(self.name)
 
 
 class Class(Expr):
+    __slots__ = ('name', 'body', 'superClass', 'captures')
+    fields = ('name', 'body', 'superClass')
+
     def __init__(self, name, body, superClass):
         assert isinstance(name, Var), "Class name is invalid"
         assert self.bodyIsOk(body), "Class body can only contain method and variable declarations"
@@ -353,6 +979,20 @@ class Class(Expr):
         self.name = name
         self.body = body
         self.superClass = superClass
+        self.captures = None
+
+    def capturedNames(self):
+        """
+        Returns the names the constructor of this class may need from the environment the class is defined in
+        """
+        if self.captures is None:
+            self.captures = []
+            constructors = [m for m in statements(self.body) if isinstance(m, Function) and m.name.name == 'constructor']
+            if constructors:
+                # The arguments and super are bound by the call
+                bound = {'super', *(a.name for a in constructors[-1].args)}
+                self.captures = [n for n in scopeNames(constructors[-1].exp) if n not in bound]
+        return self.captures
 
     def bodyIsOk(self, body):
         """
@@ -361,18 +1001,17 @@ class Class(Expr):
         """
         if isinstance(body, Assign) or isinstance(body, Function):
             return True
-        if not isinstance(body, Seq):
+        if not isinstance(body, Block):
             return False
-        # Make sure everything has an access
-        if isinstance(body.left, Function) and not isinstance(body.left, AccessFunction):
-            body.left = AccessFunction.fromFunc(body.left, PrivacyMod.PUBLIC)
-        if isinstance(body.right, Function) and not isinstance(body.right, AccessFunction):
-            body.right = AccessFunction.fromFunc(body.right, PrivacyMod.PUBLIC)
-        if isinstance(body.left, Assign) and not isinstance(body.left, AccessAssign):
-            body.left = AccessAssign.fromAssign(body.left, PrivacyMod.PUBLIC)
-        if isinstance(body.right, Assign) and not isinstance(body.right, AccessAssign):
-            body.right = AccessAssign.fromAssign(body.right, PrivacyMod.PUBLIC)
-        return self.bodyIsOk(body.left) and self.bodyIsOk(body.right)
+        for i, member in enumerate(body.body):
+            # Make sure everything has an access
+            if isinstance(member, Function) and not isinstance(member, AccessFunction):
+                body.body[i] = AccessFunction.fromFunc(member, PrivacyMod.PUBLIC)
+            elif isinstance(member, Assign) and not isinstance(member, AccessAssign):
+                body.body[i] = AccessAssign.fromAssign(member, PrivacyMod.PUBLIC)
+            elif not self.bodyIsOk(member):
+                return False
+        return True
 
     def destructBody(self, body):
         """
@@ -383,43 +1022,105 @@ class Class(Expr):
 
         Parameter body: the body of the class
         """
-        if isinstance(body, Assign):
-            # Evaluate the assignment statement to get its environment
-            _, env = body.eval({})
-            return env, {}
-        if isinstance(body, Function):
-            # Evaluate the function to get the environment mapping func name to closure
-            _, env = body.eval({})
-            return {}, env
-        leftClassVars, leftMethods = self.destructBody(body.left)
-        rightClassVars, rightMethods = self.destructBody(body.right)
-        return {**leftClassVars, **rightClassVars}, {**leftMethods, **rightMethods}
+        classVars, methods = {}, {}
+        for member in statements(body):
+            # Evaluate each member on its own to get the environment mapping its name to its value
+            _, env = member.eval({})
+            (methods if isinstance(member, Function) else classVars).update(env)
+        return classVars, methods
 
     def eval(self, env):
         if self.superClass is not None:
             superClass = env[self.superClass.name]
         else:
             superClass = None
-        classInfo = ClassInfo(self.name.name, *self.destructBody(self.body), superClass)
+        outer = capture(env, self.capturedNames())
+        classInfo = ClassInfo(self.name.name, *self.destructBody(self.body), superClass, outer)
         env[self.name.name] = classInfo
         return classInfo, env
 
 
 class Dot(Expr):
+    __slots__ = ('obj', 'attr', 'cache', 'layout')
+    fields = ('obj', 'attr')
+
     def __init__(self, obj, attr):
         assert isinstance(obj, Expr), "Left side of a dot operator must be an expression"
         assert isinstance(attr, Var), f"Right side of a dot operator must be a variable, {attr} is not"
         self.obj = obj
         self.attr = attr
+        # The member table and receiver type of the last class member looked up, and the member
+        self.cache = (None, None, None)
+        # The shape of the last object looked at, and the slot of this attribute in it
+        self.layout = (None, None)
 
     def eval(self, env):
-        attr = self.attr.name
         classInfo, newEnv = self.obj.eval(env)
-        if self.obj.name == 'super':
+        return self.lookup(classInfo), newEnv
+
+    def lookup(self, classInfo):
+        """
+        Returns the value of this attribute on classInfo, checking its access
+
+        Parameter classInfo: the value the left side of the dot evaluated to
+        """
+        val, receiver = self.resolve(classInfo)
+        return val if receiver is None else val.methodify(receiver)
+
+    def resolve(self, classInfo):
+        """
+        Returns (value, receiver), checking the access of this attribute on classInfo
+
+        receiver is None unless value is a method closure, in which case it is
+        the object the method is called on. Calls use this to run a method
+        without making a MethodClosure for it.
+
+        Parameter classInfo: the value the left side of the dot evaluated to
+        """
+        attr = self.attr.name
+        if isinstance(self.obj, Var) and self.obj.name == 'super':
             (obj, cls) = classInfo
-            return cls[attr][0][0].methodify(obj), newEnv
+            return cls[attr][0][0], obj
+
+        if isinstance(classInfo, (Object, PrivateObject)):
+            obj = classInfo.obj if type(classInfo) == PrivateObject else classInfo
+            # Objects with the same shape keep this attribute, if they have it, in the same slot
+            shape, slot = self.layout
+            if shape is not obj.shape:
+                shape = obj.shape
+                slot = shape.slots.get(attr)
+                self.layout = shape, slot
+            if slot is not None:
+                val, isMethod = self.member(obj.values[slot], classInfo)
+                return val, classInfo if isMethod else None
+
+        table = classInfo.members() if isinstance(classInfo, (ClassInfo, PrivateObject)) else None
+        if table is None:
+            val, isMethod = self.member(classInfo[attr], classInfo)
+        else:
+            # Members of a class resolve the same way every time until a class variable is assigned
+            # (which rebuilds the table), so the last one looked up here is kept
+            cachedTable, cachedType, member = self.cache
+            if cachedTable is not table or cachedType is not type(classInfo):
+                try:
+                    member = self.member(classInfo[attr], classInfo)
+                except Exception as e:
+                    member = Unresolvable(e)
+                self.cache = table, type(classInfo), member
+            if type(member) == Unresolvable:
+                member.fail()
+            val, isMethod = member
+        return val, classInfo if isMethod else None
+
+    def member(self, val, classInfo):
+        """
+        Returns (value, isMethod), checking the access of the attribute
 
-        val = classInfo[attr]
+        isMethod is true when value is a closure still to be bound to classInfo
+
+        Parameter val: classInfo[attr]
+        Parameter classInfo: the value the left side of the dot evaluated to
+        """
         owner = AttrOwner.THIS
         if isinstance(val, tuple):
             val, owner = val
@@ -428,22 +1129,25 @@ class Dot(Expr):
             clos, access = val
             if access != PrivacyMod.PUBLIC and not isinstance(classInfo, PrivateObject):
                 raise TypeError("Attempted to access private method in public context!")
-            return clos.methodify(classInfo), newEnv
+            return clos, True
         if isinstance(val, tuple):
             if isinstance(val[0], tuple):
                 val, owner = val
             v, access = val
             if access != PrivacyMod.PUBLIC and not isinstance(classInfo, PrivateObject):
                 raise TypeError("Attempted to access private variable in public context!")
-            return v, newEnv
-        return val, newEnv
+            return v, False
+        return val, False
 
     def __str__(self):
         return f"{self.obj}.{self.attr}"
 
 
 class Function(Expr):
-    def __init__(self, name, params, exp):
+    __slots__ = ('name', 'args', 'exp', 'pure', 'captures')
+    fields = ('name', 'args', 'exp')
+
+    def __init__(self, name, params, exp, pure=False):
         for p in params:
             assert isinstance(p, Var)
         assert isinstance(name, Var)
@@ -451,46 +1155,84 @@ class Function(Expr):
         self.name = name
         self.args = params
         self.exp = exp
+        # Whether calls with the same arguments always give the same result, so results can be cached
+        self.pure = pure
+        self.captures = None
+
+    def capturedNames(self):
+        """
+        Returns the names a closure of this function copies out of its environment
+
+        Parameters are included because the copied bindings take precedence over them
+        """
+        if self.captures is None:
+            self.captures = scopeNames(self.exp, [a.name for a in self.args] + [self.name.name])
+        return self.captures
+
+    def closure(self, expr, env):
+        """
+        Returns a new closure of this function, running expr
+
+        Parameter env: the bindings the closure captures
+        """
+        clos = Closure(expr, self.args, env)
+        if self.pure:
+            clos.memo = Memo(self.name.name)
+        return clos
 
     def eval(self, env):
-        clos = Closure(self.exp, self.args, env.copy())
+        clos = self.closure(self.exp, capture(env, self.capturedNames()))
         clos.env[self.name.name] = clos
         env[self.name.name] = clos
         return clos, env
 
     def __str__(self):
         args = ",".join(map(str, self.args))
-        return f"def {self.name}({args}): {self.exp}"
+        return f"def {'pure ' if self.pure else ''}{self.name}({args}): {self.exp}"
 
 
 class AccessFunction(Function):
-    def __init__(self, name, params, exp, access):
-        super().__init__(name, params, exp)
+    __slots__ = ('access',)
+
+    def __init__(self, name, params, exp, access, pure=False):
+        super().__init__(name, params, exp, pure)
         assert isinstance(access, PrivacyMod)
         self.access = access
 
     @classmethod
     def fromFunc(cls, function, access):
         assert isinstance(function, Function)
-        return AccessFunction(function.name, function.args, function.exp, access)
+        return AccessFunction(function.name, function.args, function.exp, access, function.pure).locate(function)
 
     def eval(self, env):
-        clos = Closure(self.exp, self.args, env.copy())
+        clos = self.closure(self.exp, capture(env, self.capturedNames()))
         clos.env[self.name.name] = clos, self.access
         env[self.name.name] = clos, self.access
         return clos, env
 
 
 class AnonFunction(Expr):
+    __slots__ = ('args', 'exp', 'captures')
+    fields = ('args', 'exp')
+
     def __init__(self, params, exp):
         for p in params:
             assert isinstance(p, Var)
         assert isinstance(exp, Expr)
         self.args = params
         self. exp = exp
+        self.captures = None
+
+    def capturedNames(self):
+        """
+        Returns the names a closure of this function copies out of its environment
+        """
+        if self.captures is None:
+            self.captures = scopeNames(self.exp, [a.name for a in self.args])
+        return self.captures
 
     def eval(self, env):
-        clos = Closure(self.exp, self.args, env.copy())
+        clos = Closure(self.exp, self.args, capture(env, self.capturedNames()))
         return clos, env
 
     def __str__(self):
@@ -499,6 +1241,9 @@ class AnonFunction(Expr):
 
 
 class App(Expr):
+    __slots__ = ('func', 'args')
+    fields = ('func', 'args')
+
     def __init__(self, func, args):
         assert isinstance(func, Expr) or isinstance(func, AnonFunction)
         for a in args:
@@ -507,41 +1252,72 @@ class App(Expr):
         self.args = args
 
     def eval(self, env):
-        clos, env1 = self.func.eval(env)
+        value, env1 = self.call(env)
+        # Calls in tail position return to here, so deep recursion does not use up the Python stack
+        while type(value) == TailCall:
+            body, bodyEnv = value
+            value = body.tail(bodyEnv)
+        return value, env1
+
+    def tail(self, env):
+        return self.call(env)[0]
+
+    def call(self, env):
+        """
+        Returns the configuration of this call, with a TailCall in place of the value of a closure call
+        """
+        if type(self.func) == Dot:
+            # Call methods directly rather than through a MethodClosure
+            classInfo, env1 = self.func.obj.eval(env)
+            clos, receiver = self.func.resolve(classInfo)
+            if receiver is not None:
+                return self.callMethod(clos, receiver, env), env1
+        else:
+            clos, env1 = self.func.eval(env)
         # Handle class methods
         if isinstance(clos, tuple):
-            print(clos)
             clos, _ = clos
+        if isinstance(clos, MethodClosure):
+            return self.callMethod(clos, clos.obj, env), env1
         if isinstance(clos, Closure):
-            # Copy the args, and if we have a method call, insert the object for "this"
-            newArgs = self.args.copy()
-            if isinstance(clos, MethodClosure):
-                newArgs.insert(0, clos.obj)
-            if len(clos.args) != len(newArgs):
+            if len(clos.args) != len(self.args):
                 raise TypeError("Number of arguments does not match number of parameters")
-            env2 = {k.name: v.eval(env)[0] for (k, v) in zip(clos.args, newArgs)}
-            if isinstance(clos, MethodClosure):
-                env2['this'] = PrivateObject(env2['this'])
-                if 'super' in env:
-                    superClass = env['super'][1].superClass if env['super'][1] else None
-                else:
-                    superClass = clos.obj.superClass
-                env2['super'] = (clos.obj, superClass)
-            return clos.expr.eval({**env2, **clos.env})[0], env1
+            vals = [v.eval(env)[0] for v in self.args]
+            if clos.memo is not None:
+                return clos.memo.call(vals, lambda: complete(clos.expr.tail(clos.callEnv(vals, env)))), env1
+            return TailCall((clos.expr, clos.callEnv(vals, env))), env1
         # Handle constructor calls
         if isinstance(clos, ClassInfo):
             # Create a new object
             obj = clos(self.args, env)
             return obj, env1
+        if type(clos) == Builtin:
+            return clos.function(*[v.eval(env)[0] for v in self.args]), env1
 
         raise NotAFunction(self.func)
 
+    def callMethod(self, clos, receiver, env):
+        """
+        Returns the TailCall for calling clos as a method of receiver
+
+        Parameter receiver: the object (or PrivateObject) the method was looked up on
+        Parameter env: the environment of the caller
+        """
+        # Leave room for "this"
+        if len(clos.args) != len(self.args) + 1:
+            raise TypeError("Number of arguments does not match number of parameters")
+        vals = [receiver.eval(env)[0]] + [v.eval(env)[0] for v in self.args]
+        return TailCall((clos.expr, clos.methodEnv(receiver, vals, env)))
+
     def __str__(self):
         args = ",".join(map(str, self.args))
         return f"app {self.func} to ({args})"
 
 
 class BinExp(Expr):
+    __slots__ = ('left', 'right')
+    fields = ('left', 'right')
+
     def __init__(self, a1, a2):
         assert isinstance(a1, Expr) and isinstance(a2, Expr)
         self.left = a1
@@ -549,15 +1325,19 @@ class BinExp(Expr):
 
 
 class Plus(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
-        return n1 + n2, env
+        return add(n1, n2), env
 
     def __str__(self):
         return f"{self.left} + {self.right}"
 
 
 class Minus(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 - n2, env
@@ -567,6 +1347,8 @@ class Minus(BinExp):
 
 
 class Times(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 * n2, env
@@ -576,6 +1358,8 @@ class Times(BinExp):
 
 
 class Input(Expr):
+    __slots__ = ()
+
     def eval(self, env):
         return int(input(">")), env
 
@@ -584,6 +1368,8 @@ class Input(Expr):
 
 
 class Equals(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 == n2, env
@@ -593,6 +1379,8 @@ class Equals(BinExp):
 
 
 class NotEquals(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 != n2, env
@@ -602,6 +1390,8 @@ class NotEquals(BinExp):
 
 
 class Less(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 < n2, env
@@ -611,6 +1401,8 @@ class Less(BinExp):
 
 
 class LessEq(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 <= n2, env
@@ -620,6 +1412,8 @@ class LessEq(BinExp):
 
 
 class Greater(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 > n2, env
@@ -629,6 +1423,8 @@ class Greater(BinExp):
 
 
 class GreaterEq(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         n1, n2 = self.left.eval(env)[0], self.right.eval(env)[0]
         return n1 >= n2, env
@@ -638,6 +1434,9 @@ class GreaterEq(BinExp):
 
 
 class Not(Expr):
+    __slots__ = ('bexp',)
+    fields = ('bexp',)
+
     def __init__(self, b):
         assert isinstance(b, Expr)
         self.bexp = b
@@ -650,23 +1449,35 @@ class Not(Expr):
 
 
 class And(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         # Can't bind variables and still short circuit
         return self.left.eval(env)[0] and self.right.eval(env)[0], env
 
+    def tail(self, env):
+        return self.left.eval(env)[0] and self.right.tail(env)
+
     def __str__(self):
         return f"{self.left} and {self.right}"
 
 
 class Or(BinExp):
+    __slots__ = ()
+
     def eval(self, env):
         return self.left.eval(env)[0] or self.right.eval(env)[0], env
 
+    def tail(self, env):
+        return self.left.eval(env)[0] or self.right.tail(env)
+
     def __str__(self):
         return f"{self.left} or {self.right}"
 
 
-class Null(Expr):
+class Null(Singleton):
+    __slots__ = ()
+
     def eval(self, env):
         return None, env
 
@@ -674,7 +1485,9 @@ class Null(Expr):
         return "null"
 
 
-class Skip(Expr):
+class Skip(Singleton):
+    __slots__ = ()
+
     def eval(self, env):
         return (), env
 
@@ -683,6 +1496,9 @@ class Skip(Expr):
 
 
 class Assign(Expr):
+    __slots__ = ('var', 'exp')
+    fields = ('var', 'exp')
+
     def __init__(self, var, exp):
         assert isinstance(var, Var) or isinstance(var, Dot) or isinstance(var, Index) or isinstance(var, Slice), "Left side of an assignment statement must support assignment"
         assert isinstance(exp, Expr)
@@ -723,6 +1539,8 @@ class Assign(Expr):
 
 
 class AccessAssign(Assign):
+    __slots__ = ('access',)
+
     def __init__(self, var, exp, access):
         super().__init__(var, exp)
         assert isinstance(access, PrivacyMod)
@@ -731,7 +1549,7 @@ class AccessAssign(Assign):
     @classmethod
     def fromAssign(cls, assign, access):
         assert isinstance(assign, Assign)
-        return AccessAssign(assign.var, assign.exp, access)
+        return AccessAssign(assign.var, assign.exp, access).locate(assign)
 
     def eval(self, env):
         if isinstance(self.var, Var):
@@ -744,22 +1562,39 @@ class AccessAssign(Assign):
         return (), env
 
 
-class Seq(Expr):
-    def __init__(self, c1, c2):
-        assert isinstance(c1, Expr), f"First command {c1} of sequence is not a valid expression!"
-        assert isinstance(c2, Expr), f"Second command {c2} of sequence is not a valid expression!"
-        self.left = c1
-        self.right = c2
+class Block(Expr):
+    """
+    Commands run one after another, c1; c2; ...; cn, whose value is the value of the last one
+    """
+    __slots__ = ('body',)
+    fields = ('body',)
+
+    def __init__(self, body):
+        assert body, "A block must have at least one command"
+        for c in body:
+            assert isinstance(c, Expr), f"Command {c} of sequence is not a valid expression!"
+        self.body = body
 
     def eval(self, env):
-        _, env = self.left.eval(env)
-        return self.right.eval(env)
+        body = self.body
+        for i in range(len(body) - 1):
+            _, env = body[i].eval(env)
+        return body[-1].eval(env)
+
+    def tail(self, env):
+        body = self.body
+        for i in range(len(body) - 1):
+            _, env = body[i].eval(env)
+        return body[-1].tail(env)
 
     def __str__(self):
-        return f"{self.left} ; {self.right}"
+        return " ; ".join(map(str, self.body))
 
 
 class If(Expr):
+    __slots__ = ('guard', 'beq', 'bneq')
+    fields = ('guard', 'beq', 'bneq')
+
     def __init__(self, b, c1, c2):
         assert isinstance(b, Expr) and isinstance(c1, Expr) and isinstance(c2, Expr)
         self.guard = b
@@ -771,11 +1606,19 @@ class If(Expr):
             return self.beq.eval(env)
         return self.bneq.eval(env)
 
+    def tail(self, env):
+        if self.guard.eval(env)[0]:
+            return self.beq.tail(env)
+        return self.bneq.tail(env)
+
     def __str__(self):
         return f"if {self.guard} then {self.beq} else {self.bneq}"
 
 
 class While(Expr):
+    __slots__ = ('guard', 'loop')
+    fields = ('guard', 'loop')
+
     def __init__(self, bexp, c):
         assert isinstance(bexp, Expr), f'Loop guard {bexp} is not a valid expression!'
         assert isinstance(c, Expr), f'Loop body {c} is not a valid expression!'
@@ -783,13 +1626,54 @@ class While(Expr):
         self.loop = c
 
     def eval(self, env):
-        if self.guard.eval(env)[0]:
-            _, env = self.loop.eval(env)
-            return self.eval(env)
+        while self.guard.eval(env)[0]:
+            try:
+                _, env = self.loop.eval(env)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
+        return (), env
+
+    def __str__(self):
+        return f"while {self.guard} do {self.loop}"
+
+
+class For(Expr):
+    """
+    for x in e { c }, which runs c with x bound to each element of the value of e in turn
+    """
+    __slots__ = ('var', 'iterable', 'loop')
+    fields = ('var', 'iterable', 'loop')
+
+    def __init__(self, var, iterable, c):
+        assert isinstance(var, Var), f'Loop variable {var} is not a variable!'
+        assert isinstance(iterable, Expr), f'Loop collection {iterable} is not a valid expression!'
+        assert isinstance(c, Expr), f'Loop body {c} is not a valid expression!'
+        self.var = var
+        self.iterable = iterable
+        self.loop = c
+
+    def eval(self, env):
+        name = self.var.name
+        for value in iterate(self.iterable.eval(env)[0]):
+            env[name] = value
+            try:
+                _, env = self.loop.eval(env)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
         return (), env
 
+    def __str__(self):
+        return f"for {self.var} in {self.iterable} do {self.loop}"
+
 
 class Print(Expr):
+    __slots__ = ('exp',)
+    fields = ('exp',)
+
     def __init__(self, exp):
         assert isinstance(exp, Expr)
         self.exp = exp
@@ -804,6 +1688,9 @@ class Print(Expr):
 
 
 class Test(Expr):
+    __slots__ = ('exp',)
+    fields = ('exp',)
+
     def __init__(self, exp):
         assert isinstance(exp, Expr)
         self.exp = exp
@@ -818,8 +1705,24 @@ class Test(Expr):
 
 
 class Break(Expr):
-    pass
+    __slots__ = ()
+
+    def eval(self, env):
+        raise BreakLoop()
+
+    def __str__(self):
+        return "break"
 
 
 class Continue(Expr):
-    pass
+    __slots__ = ()
+
+    def eval(self, env):
+        raise ContinueLoop()
+
+    def __str__(self):
+        return "continue"
+
+
+# Loaded last, since the builtins are made of what is defined above
+from oomphbuiltins import BUILTINS
@@ -0,0 +1,154 @@
+"""
+Times the workloads in the benchmarks directory and checks them against a baseline
+
+Each workload is an OOMPH program whose value is the number of operations
+it performed (loop iterations, calls, objects made and so on), so a run
+is reported in operations per second. Workloads are parsed once, run a
+few times to warm up, and then timed over several repetitions, keeping
+the best. --save-baseline stores the results as a baseline, and --compare
+fails if any workload got slower than the baseline by more than --threshold.
+Baselines depend on the machine, so none is committed: save one first.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import oomphoptimize
+from main import ENGINES, PARSERS
+
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+
+
+def workloads(names=None):
+    """
+    Returns {name: source} for the workloads in the benchmarks directory
+
+    Parameter names: the workloads to return, or None for all of them
+    """
+    found = {}
+    for filename in sorted(glob.glob(os.path.join(BENCHMARKS, '*.oomph'))):
+        name = os.path.splitext(os.path.basename(filename))[0]
+        if names is None or name in names:
+            with open(filename) as file:
+                found[name] = file.read()
+    missing = set(names or ()) - set(found)
+    if missing:
+        raise ValueError(f"No such workloads: {', '.join(sorted(missing))}")
+    return found
+
+
+def bench(tree, run, warmup, repeat):
+    """
+    Returns (operations, seconds of each timed run) for running tree with run
+
+    Parameter warmup: how many untimed runs come first
+    Parameter repeat: how many runs are timed
+    """
+    for _ in range(warmup):
+        run(tree, {})
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops, _ = run(tree, {})
+        times.append(time.perf_counter() - start)
+    if type(ops) != int or ops <= 0:
+        raise ValueError(f"A workload must evaluate to how many operations it did, not {ops!r}")
+    return ops, times
+
+
+def regressions(results, baseline, threshold):
+    """
+    Returns [(engine, name, old, new)] for each workload whose rate fell by more than threshold
+
+    Parameter results, baseline: {engine: {name: operations per second}}
+    Parameter threshold: the fraction of its baseline rate a workload may lose
+    """
+    slower = []
+    for engine, rates in results.items():
+        for name, rate in rates.items():
+            old = baseline.get(engine, {}).get(name)
+            if old is not None and rate < old * (1 - threshold):
+                slower.append((engine, name, old, rate))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the OOMPH benchmark workloads')
+    parser.add_argument('--engine', action="append", dest="engines", choices=ENGINES,
+                        help="An engine to time, given once for each (default: tree)")
+    parser.add_argument('--parser', action="store", dest="parser", choices=PARSERS, default='ply',
+                        help="The parser to read the workloads with")
+    parser.add_argument('-O', action="store_true", dest="optimize",
+                        help="Optimize the workloads before timing them")
+    parser.add_argument('--only', action="store", dest="only", nargs='+', metavar='NAME',
+                        help="Only time these workloads")
+    parser.add_argument('--warmup', action="store", dest="warmup", type=int, default=1,
+                        help="Untimed runs of each workload before timing it (default %(default)s)")
+    parser.add_argument('--repeat', action="store", dest="repeat", type=int, default=10,
+                        help="Timed runs of each workload (default %(default)s)")
+    parser.add_argument('--save-baseline', '--save', action="store", dest="save", nargs='?', metavar='FILE',
+                        const=os.path.join(BENCHMARKS, 'baseline.json'),
+                        help="Store the results as the baseline (default benchmarks/baseline.json)")
+    parser.add_argument('--compare', action="store", dest="compare", nargs='?', metavar='FILE',
+                        const=os.path.join(BENCHMARKS, 'baseline.json'),
+                        help="Fail if a workload is slower than in this baseline (default benchmarks/baseline.json), "
+                             "which --save-baseline stores")
+    parser.add_argument('--threshold', action="store", dest="threshold", type=float, default=0.1,
+                        help="The fraction of its baseline speed a workload may lose before failing (default %(default)s)")
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    try:
+        progs = workloads(args.only)
+    except ValueError as e:
+        parser.error(str(e))
+    baseline = {}
+    if args.compare:
+        if not os.path.exists(args.compare):
+            parser.error(f"there is no baseline at {args.compare}, since baselines depend on the machine and "
+                         f"none is committed: run bench.py with --save-baseline before the change to store one")
+        with open(args.compare) as file:
+            baseline = json.load(file)
+    results = {}
+    for engine in args.engines or ['tree']:
+        print(f"{engine}:")
+        print(f"  {'workload':<12}{'best ops/s':>14}{'median ops/s':>16}{'baseline':>14}{'change':>9}")
+        results[engine] = {}
+        for name, prog in progs.items():
+            tree = PARSERS[args.parser](prog)
+            if args.optimize:
+                tree = oomphoptimize.optimize(tree)
+            ops, times = bench(tree, ENGINES[engine], args.warmup, args.repeat)
+            rate = ops / min(times)
+            results[engine][name] = rate
+            line = f"  {name:<12}{rate:>14,.0f}{ops / statistics.median(times):>16,.0f}"
+            old = baseline.get(engine, {}).get(name)
+            if old is not None:
+                line += f"{old:>14,.0f}{rate / old - 1:>+9.1%}"
+            print(line)
+
+    if args.save:
+        # Other engines already in the baseline are kept
+        saved = {}
+        if os.path.exists(args.save):
+            with open(args.save) as file:
+                saved = json.load(file)
+        for engine, rates in results.items():
+            saved.setdefault(engine, {}).update(rates)
+        with open(args.save, 'w') as file:
+            json.dump(saved, file, indent=2, sort_keys=True)
+        print(f"Saved the results to {args.save}")
+
+    slower = regressions(results, baseline, args.threshold)
+    for engine, name, old, new in slower:
+        print(f"REGRESSION: {name} on {engine} went from {old:,.0f} to {new:,.0f} ops/s ({new / old - 1:+.1%})")
+    sys.exit(1 if slower else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,11 @@
-from ply import lex, yacc
-import oomphlex
 import oomphparse
 import ast
 
 
 def main():
-    parser = yacc.yacc(module=oomphparse)
     with open("demo.oomph") as file:
         prog = file.read()
-    demo = parser.parse(prog)
+    demo = oomphparse.parse(prog)
     _, env = demo.eval({})
     while True:
         text = input("> ")
@@ -17,7 +14,7 @@ def main():
         if text == "env()":
             print(env)
             continue
-        result = parser.parse(text)
+        result = oomphparse.parse(text)
         try:
             v, env = result.eval(env)
             print(">> " + str(v))
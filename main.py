@@ -1,21 +1,167 @@
-import oomphparse
+import sys
+import time
+# Taken before the other imports so --startup-timing can report them
+STARTED = time.perf_counter()
+import ast
+import oomphcache
 import argparse
+IMPORTED = time.perf_counter()
+
+
+def runTree(tree, env):
+    return tree.eval(env)
+
+
+def runCompiled(tree, env):
+    # Imported here so a run only loads the engine it uses
+    import oomphcompile
+    return oomphcompile.run(tree, env)
+
+
+def runCek(tree, env):
+    import oomphcek
+    return oomphcek.run(tree, env)
+
+
+def runVm(tree, env):
+    import oomphvm
+    return oomphvm.run(tree, env)
+
+
+# Ways to run a parsed program, each returning the (value, env) configuration of eval
+ENGINES = {
+    'tree': runTree,
+    'compiled': runCompiled,
+    'cek': runCek,
+    'vm': runVm,
+}
+
+
+def parsePly(prog, line=1, column=1):
+    # Imported here so runs that hit the tree cache never load the parsers
+    import oomphparse
+    return oomphparse.parse(prog, line, column)
+
+
+def parsePratt(prog, line=1, column=1):
+    import oomphpratt
+    return oomphpratt.parse(prog, line, column)
+
+
+# Ways to turn the text of a program into its tree, each printing syntax errors and returning None for them
+PARSERS = {
+    'ply': parsePly,
+    'pratt': parsePratt,
+}
 
 
 def main():
     parser = argparse.ArgumentParser(
         description='OOOOOOMMPPPHHHHH')
     parser.add_argument('-f', action="store", dest="f", type=str, required=True,
-                        help="Run the OOPMH interpreter on file F")
+                        help="Run the OOPMH interpreter on file F, or on standard input if F is - and --stream is given")
+    parser.add_argument('--engine', action="store", dest="engine", choices=ENGINES, default='tree',
+                        help="Evaluate by walking the tree (default), by compiling it to closures first, "
+                             "on a machine with its own stack, or by compiling it to bytecode for a stack VM")
+    parser.add_argument('--parser', action="store", dest="parser", choices=PARSERS, default='ply',
+                        help="Parse with the PLY generated parser (default) or with the hand written one, "
+                             "which needs no tables")
+    parser.add_argument('-O', action="store_true", dest="optimize",
+                        help="Fold constant expressions and drop branches that can never run before running the program")
+    parser.add_argument('--stream', action="store_true", dest="stream",
+                        help="Parse and run the top-level statements of the program one at a time as they are read, "
+                             "so memory does not grow with the length of the program")
+    parser.add_argument('--no-cache', action="store_false", dest="cache",
+                        help="Always parse the program, instead of reusing its tree from the last run "
+                             "when the file has not changed")
+    parser.add_argument('--memo-size', action="store", dest="memoSize", type=int, default=ast.Memo.maxSize,
+                        help="How many results each pure function keeps cached (default %(default)s)")
+    parser.add_argument('--memo-stats', action="store_true", dest="memoStats",
+                        help="Print how well the cache of each pure function worked to stderr")
+    parser.add_argument('--dis', action="store_true", dest="dis",
+                        help="Print the bytecode the program compiles to instead of running it")
+    parser.add_argument('--profile', action="store_true", dest="profile",
+                        help="Print how often each function and kind of node ran and how long it took to stderr "
+                             "(tree engine only)")
+    parser.add_argument('--profile-stacks', action="store", dest="profileStacks", metavar='FILE',
+                        help="Profile the run and write the time spent in each stack of functions to FILE, "
+                             "in the collapsed format flame graph tools read")
+    parser.add_argument('--startup-timing', action="store_true", dest="startupTiming",
+                        help="Print how long each stage of the run took to stderr")
 
     args = parser.parse_args()
+    if (args.profile or args.profileStacks) and args.engine != 'tree':
+        parser.error("--profile only works with the tree engine")
+    if args.stream and (args.dis or args.profile or args.profileStacks):
+        parser.error("--stream can't be combined with --dis or --profile")
     in_file = args.f
+    ast.Memo.maxSize = args.memoSize
+
+    laps = [('imports', IMPORTED - STARTED)]
+    last = time.perf_counter()
+
+    def lap(stage):
+        nonlocal last
+        now = time.perf_counter()
+        laps.append((stage, now - last))
+        last = now
+
+    if args.stream:
+        import oomphstream
+        optimize = None
+        if args.optimize:
+            import oomphoptimize
+            optimize = oomphoptimize.optimize
+        if in_file == '-':
+            print(oomphstream.run(sys.stdin, PARSERS[args.parser], ENGINES[args.engine], {}, optimize))
+        else:
+            with open(in_file) as file:
+                print(oomphstream.run(file, PARSERS[args.parser], ENGINES[args.engine], {}, optimize))
+        return
 
     with open(in_file) as file:
         prog = file.read()
-    result = oomphparse.parser.parse(prog)
+    result = oomphcache.loadTree(in_file, prog, args.parser, args.optimize) if args.cache else None
+    if args.cache:
+        lap('tree cache')
+    if result is None:
+        if args.parser == 'ply':
+            import oomphlex
+            import oomphparse
+            oomphlex.getLexer()
+            lap('lexer tables')
+            oomphparse.getParser()
+            lap('parser tables')
+        result = PARSERS[args.parser](prog)
+        lap('parse')
+        if args.optimize and result is not None:
+            import oomphoptimize
+            result = oomphoptimize.optimize(result)
+            lap('optimize')
+        if args.cache and result is not None:
+            oomphcache.saveTree(in_file, prog, args.parser, result, args.optimize)
+            lap('cache tree')
     # print(result)
-    print(result.eval({}))
+    if args.dis:
+        import oomphvm
+        print(oomphvm.disassemble(oomphvm.compileProgram(result)))
+    elif (args.profile or args.profileStacks) and result is not None:
+        import oomphprofile
+        profiler = oomphprofile.Profiler(result)
+        print(profiler.run(result.eval, {}))
+        if args.profile:
+            print(profiler.table(), file=sys.stderr)
+        if args.profileStacks:
+            profiler.writeStacks(args.profileStacks)
+    else:
+        print(ENGINES[args.engine](result, {}))
+    lap('run')
+    if args.memoStats:
+        for memo in sorted(ast.Memo.live, key=lambda memo: memo.name):
+            print(memo, file=sys.stderr)
+    if args.startupTiming:
+        for stage, seconds in laps + [('total', time.perf_counter() - STARTED)]:
+            print(f"{stage:>14}: {seconds * 1000:8.2f} ms", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+"""
+The functions every OOMPH program can use without defining them
+
+BUILTINS maps each name to a Builtin, which a call runs as Python with
+the values of its arguments. A name is only looked up here when the
+environment has no binding for it, so a program defining a variable of
+the same name hides the builtin, as in Python. Builtins taking a function,
+like sorted, map and filter, can be given any OOMPH function, which they
+call with applyFunction.
+"""
+from ast import *
+from oomphnum import Array
+from oomphrope import text
+
+
+def array(values):
+    """
+    Returns a new numeric array of the integers in a list, tuple or array
+    """
+    assert type(values) in [list, tuple, Array], 'Can only make an array of a list, tuple or array'
+    return Array.of(values)
+
+
+def reduction(name, function):
+    """
+    Returns the builtin name, which is function except that an array is reduced by its own method
+
+    Parameter function: the Python function, like sum, working on any sequence
+    """
+    def reduce(*args):
+        if len(args) == 1 and type(args[0]) == Array:
+            return getattr(args[0], name)()
+        return function(*args)
+    return Builtin(name, reduce)
+
+
+def length(value):
+    """
+    Returns the number of elements of a string, list, tuple, dictionary or array
+    """
+    assert type(value) in ITERABLE, 'Can only take the length of a string, list, tuple, dictionary or array'
+    return len(value)
+
+
+def numbers(*bounds):
+    """
+    Returns the list of integers from start up to stop, like Python's range
+
+    Parameter bounds: stop, or start and stop, or start, stop and step
+    """
+    return list(range(*bounds))
+
+
+def sortedBy(values, key=None):
+    """
+    Returns a sorted list of the elements of values, compared by what the function key returns for them if given
+    """
+    if key is None:
+        return sorted(iterate(values))
+    return sorted(iterate(values), key=lambda v: applyFunction(key, [v]))
+
+
+def mapped(function, values):
+    """
+    Returns the list of what function returns for each element of values
+    """
+    return [applyFunction(function, [v]) for v in iterate(values)]
+
+
+def filtered(predicate, values):
+    """
+    Returns the list of the elements of values that predicate holds for
+    """
+    return [v for v in iterate(values) if applyFunction(predicate, [v])]
+
+
+def keys(value):
+    """
+    Returns the list of the keys of a dictionary
+    """
+    assert type(value) == dict, 'Can only take the keys of a dictionary'
+    return list(value)
+
+
+def join(separator, values):
+    """
+    Returns the strings of values joined with separator between them
+    """
+    assert type(text(separator)) == str, 'Can only join with a string'
+    return text(separator).join(map(text, iterate(values)))
+
+
+def integer(value):
+    """
+    Returns the integer a string, boolean or integer stands for
+    """
+    return int(text(value))
+
+
+BUILTINS = {builtin.name: builtin for builtin in [
+    Builtin('array', array),
+    Builtin('len', length),
+    Builtin('range', numbers),
+    Builtin('sorted', sortedBy),
+    Builtin('map', mapped),
+    Builtin('filter', filtered),
+    Builtin('keys', keys),
+    Builtin('str', str),
+    Builtin('int', integer),
+    Builtin('join', join),
+    reduction('sum', sum),
+    reduction('min', min),
+    reduction('max', max),
+    reduction('all', all),
+    reduction('any', any),
+]}
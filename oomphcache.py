@@ -0,0 +1,143 @@
+"""
+Where OOMPH keeps files generated from its own sources, such as the PLY tables,
+and the parsed trees of the programs it runs
+
+Generated files are named after a version, a hash of the sources they were
+generated from, so a cached file is never rewritten: a change to the
+grammar just produces files with a new name. Files are written to a
+temporary name first and moved into place, so other processes only ever
+see complete files.
+"""
+import hashlib
+import importlib.util
+import os
+import pickle
+import tempfile
+
+import ply
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Set OOMPH_CACHE to keep the cache somewhere other than next to the interpreter
+CACHE_DIR = os.environ.get('OOMPH_CACHE', os.path.join(HERE, '__pycache__', 'oomph'))
+
+
+def version(*modules):
+    """
+    Returns a short hash of the sources of modules and of the PLY version
+
+    Parameter modules: names of modules of the interpreter, like 'oomphparse'
+    """
+    digest = hashlib.sha256(ply.__version__.encode())
+    for name in modules:
+        with open(os.path.join(HERE, name + '.py'), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:16]
+
+
+def path(name):
+    return os.path.join(CACHE_DIR, name)
+
+
+def loadModule(name):
+    """
+    Returns the Python module name.py in the cache, or None if it is not there
+    """
+    spec = importlib.util.spec_from_file_location(name, path(name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except FileNotFoundError:
+        return None
+    return module
+
+
+def publish(write, *names):
+    """
+    Calls write with a fresh directory, then moves the files names it wrote there into the cache
+
+    Returns False if the cache can not be written, in which case nothing is moved
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        scratch = tempfile.mkdtemp(dir=CACHE_DIR)
+    except OSError:
+        return False
+    try:
+        write(scratch)
+        for name in names:
+            os.replace(os.path.join(scratch, name), path(name))
+        return True
+    except OSError:
+        return False
+    finally:
+        for leftover in os.listdir(scratch):
+            os.remove(os.path.join(scratch, leftover))
+        os.rmdir(scratch)
+
+
+# The modules that decide what tree a program parses to
+PARSING = ('ast', 'oomphlex', 'oomphparse', 'oomphpratt')
+
+
+def treePath(filename, parser, optimized=False):
+    """
+    Returns where the tree of the program in filename is cached
+
+    Like __pycache__, each source file has one cache file for each parser,
+    named after the file and its directory so files with the same name do
+    not collide, and optimized trees are kept apart from plain ones.
+    """
+    filename = os.path.abspath(filename)
+    where = hashlib.sha256(filename.encode()).hexdigest()[:8]
+    return path(f"{os.path.basename(filename)}.{where}.{parser}{'.opt' if optimized else ''}.oomphc")
+
+
+def treeKey(prog, parser, optimized):
+    """
+    Returns what a cached tree of prog must have been stored with to still be valid, as one line of bytes
+
+    Parameter parser: the name of the parser that read prog, like 'ply'
+    """
+    modules = PARSING + ('oomphoptimize',) if optimized else PARSING
+    key = f"{hashlib.sha256(prog.encode()).hexdigest()} {parser} {'opt' if optimized else 'plain'} {version(*modules)}"
+    return key.encode() + b'\n'
+
+
+def loadTree(filename, prog, parser, optimized=False):
+    """
+    Returns the cached tree of prog, the text of filename, or None if it is missing or stale
+
+    The key the tree was stored with comes first in the file, on a line of its
+    own, so a stale or foreign file is turned down without unpickling its tree.
+
+    Parameter parser: the name of the parser the tree must have been read with
+    Parameter optimized: whether to look for the tree as optimized by oomphoptimize
+    """
+    try:
+        with open(treePath(filename, parser, optimized), 'rb') as file:
+            if file.readline() != treeKey(prog, parser, optimized):
+                return None
+            return pickle.load(file)
+    except Exception:
+        # A missing, unreadable or truncated cache is just a miss
+        return None
+
+
+def saveTree(filename, prog, parser, tree, optimized=False):
+    """
+    Caches tree, the parse of prog, the text of filename, by parser
+
+    Returns False if it could not be written, which is never an error
+    """
+    name = os.path.basename(treePath(filename, parser, optimized))
+    try:
+        data = treeKey(prog, parser, optimized) + pickle.dumps(tree, protocol=pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        # Too deeply nested to pickle
+        return False
+
+    def write(out):
+        with open(os.path.join(out, name), 'wb') as file:
+            file.write(data)
+    return publish(write, name)
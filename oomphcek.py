@@ -0,0 +1,500 @@
+"""
+An evaluator for OOMPH that keeps its own work stack, in the style of a CEK machine
+
+Every step pops an item (handler, node, env, data) off the todo stack. The
+handler either pushes the value of node onto the vals stack or pushes more
+items: subexpressions to evaluate and a continuation to combine their values.
+Since nothing is evaluated by a recursive Python call, loops, long sequences
+and calls in tail position run in constant Python stack.
+"""
+from ast import *
+
+
+def run(tree, env):
+    """
+    Runs tree in env on the machine
+
+    Returns the same (value, variableBindings) configuration as tree.eval(env)
+    """
+    vals = []
+    todo = []
+    push(todo, tree, env)
+    while todo:
+        handler, node, env2, data = todo.pop()
+        handler(node, env2, data, todo, vals)
+    return vals.pop(), env
+
+
+def push(todo, node, env):
+    """
+    Pushes the evaluation of node in env onto todo
+    """
+    todo.append((HANDLERS.get(type(node), evalTree), node, env, None))
+
+
+def pushAll(todo, nodes, env):
+    """
+    Pushes the evaluation of nodes in env onto todo, so that they are evaluated left to right
+    """
+    for node in reversed(nodes):
+        push(todo, node, env)
+
+
+def popAll(vals, n):
+    """
+    Pops the top n values off vals, returning them in the order they were pushed
+    """
+    if n == 0:
+        return []
+    items = vals[-n:]
+    del vals[-n:]
+    return items
+
+
+def evalTree(node, env, data, todo, vals):
+    # Anything we don't know about (e.g. objects passed as arguments) is walked
+    vals.append(node.eval(env)[0])
+
+
+def constant(value):
+    def handler(node, env, data, todo, vals):
+        vals.append(value)
+    return handler
+
+
+def evalValue(node, env, data, todo, vals):
+    vals.append(node.value)
+
+
+def evalCopy(node, env, data, todo, vals):
+    vals.append(node.value.copy())
+
+
+def evalVar(node, env, data, todo, vals):
+    try:
+        vals.append(env[node.name])
+    except KeyError:
+        builtin = BUILTINS.get(node.name)
+        if builtin is None:
+            raise UnboundVariable(node.name, node)
+        vals.append(builtin)
+
+
+def discard(node, env, data, todo, vals):
+    vals.pop()
+
+
+def evalList(node, env, data, todo, vals):
+    todo.append((makeList, node, env, None))
+    pushAll(todo, node.value, env)
+
+
+def makeList(node, env, data, todo, vals):
+    vals.append(popAll(vals, len(node.value)))
+
+
+def evalTuple(node, env, data, todo, vals):
+    todo.append((makeTuple, node, env, None))
+    pushAll(todo, node.value, env)
+
+
+def makeTuple(node, env, data, todo, vals):
+    vals.append(tuple(popAll(vals, len(node.value))))
+
+
+def evalDict(node, env, data, todo, vals):
+    todo.append((makeDict, node, env, None))
+    pushAll(todo, [e for kv in node.keyvals for e in kv], env)
+
+
+def makeDict(node, env, data, todo, vals):
+    items = popAll(vals, 2 * len(node.keyvals))
+    vals.append({k: v for k, v in zip(items[::2], items[1::2])})
+
+
+def evalIndex(node, env, data, todo, vals):
+    todo.append((index, node, env, None))
+    pushAll(todo, [node.obj, node.ind], env)
+
+
+def index(node, env, data, todo, vals):
+    ind, obj = vals.pop(), vals.pop()
+    assert type(obj) in INDEXABLE, 'Can only index a string or list'
+    vals.append(obj[ind])
+
+
+def bounds(node):
+    """
+    Returns the bounds of a slice that are present, as a list of expressions
+    """
+    return [e for e in (node.start, node.end) if e is not None]
+
+
+def popBounds(node, vals):
+    end = vals.pop() if node.end is not None else None
+    start = vals.pop() if node.start is not None else None
+    return start, end
+
+
+def evalSlice(node, env, data, todo, vals):
+    todo.append((slice_, node, env, None))
+    pushAll(todo, [node.obj] + bounds(node), env)
+
+
+def slice_(node, env, data, todo, vals):
+    start, end = popBounds(node, vals)
+    obj = vals.pop()
+    assert type(obj) in SLICEABLE, 'Not a sliceable item'
+    assert (type(start) == int or start is None) and (type(end) == int or end is None), "Slice indices must be integers"
+    vals.append(obj[start:end])
+
+
+def evalClass(node, env, data, todo, vals):
+    superClass = env[node.superClass.name] if node.superClass is not None else None
+    members = []
+    todo.append((makeClass, node, env, (superClass, members)))
+    # Members are evaluated on their own, just like Class.destructBody
+    for member in reversed(statements(node.body)):
+        memberEnv = {}
+        members.insert(0, (isinstance(member, Function), memberEnv))
+        todo.append((discard, member, memberEnv, None))
+        push(todo, member, memberEnv)
+
+
+def makeClass(node, env, data, todo, vals):
+    superClass, members = data
+    classVars, methods = {}, {}
+    for isMethod, memberEnv in members:
+        (methods if isMethod else classVars).update(memberEnv)
+    classInfo = ClassInfo(node.name.name, classVars, methods, superClass, capture(env, node.capturedNames()))
+    env[node.name.name] = classInfo
+    vals.append(classInfo)
+
+
+def evalDot(node, env, data, todo, vals):
+    todo.append((dot, node, env, None))
+    push(todo, node.obj, env)
+
+
+def dot(node, env, data, todo, vals):
+    vals.append(node.lookup(vals.pop()))
+
+
+def evalFunction(node, env, data, todo, vals):
+    # Defining a function evaluates nothing, so the tree can do it
+    vals.append(node.eval(env)[0])
+
+
+def evalApp(node, env, data, todo, vals):
+    if type(node.func) == Dot:
+        # Call methods directly rather than through a MethodClosure
+        todo.append((applyDot, node, env, None))
+        push(todo, node.func.obj, env)
+    else:
+        todo.append((apply, node, env, None))
+        push(todo, node.func, env)
+
+
+def applyDot(node, env, data, todo, vals):
+    clos, receiver = node.func.resolve(vals.pop())
+    vals.append(clos)
+    if receiver is None:
+        apply(node, env, data, todo, vals)
+    else:
+        callClosure(node, env, receiver, todo, vals)
+
+
+def apply(node, env, data, todo, vals):
+    clos = vals[-1]
+    if isinstance(clos, tuple):
+        clos, _ = clos
+        vals[-1] = clos
+    if isinstance(clos, Closure):
+        callClosure(node, env, clos.obj if isinstance(clos, MethodClosure) else None, todo, vals)
+        return
+    vals.pop()
+    if isinstance(clos, ClassInfo):
+        obj = Object(clos)
+        if not obj.constructor:
+            if len(node.args) > 0:
+                raise TypeError("Constructor takes no arguments")
+            vals.append(obj)
+            return
+        if len(obj.constructorClosure().args) != len(node.args) + 1:
+            raise TypeError("Invalid number of arguments for constructor call")
+        todo.append((construct, node, env, obj))
+        pushAll(todo, node.args, env)
+        return
+    if type(clos) == Builtin:
+        todo.append((callBuiltin, node, env, clos))
+        pushAll(todo, node.args, env)
+        return
+    raise NotAFunction(node.func)
+
+
+def callClosure(node, env, receiver, todo, vals):
+    """
+    Calls the closure on top of vals, as a method of receiver unless it is None
+    """
+    clos = vals[-1]
+    if len(clos.args) != len(node.args) + (receiver is not None):
+        raise TypeError("Number of arguments does not match number of parameters")
+    if receiver is not None:
+        vals.append(receiver.eval(env)[0])
+    todo.append((call, node, env, receiver))
+    pushAll(todo, node.args, env)
+
+
+def call(node, env, receiver, todo, vals):
+    args = popAll(vals, len(node.args) + (receiver is not None))
+    clos = vals.pop()
+    newEnv = clos.callEnv(args, env) if receiver is None else clos.methodEnv(receiver, args, env)
+    if clos.memo is not None and receiver is None:
+        key = clos.memo.key(args)
+        if key is not None:
+            value = clos.memo.get(key)
+            if value is not NOT_CACHED:
+                vals.append(value)
+                return
+            todo.append((memoize, node, None, (clos.memo, key)))
+    # The body's value is the value of the call, so nothing needs to wait for it
+    push(todo, clos.expr, newEnv)
+
+
+def callBuiltin(node, env, builtin, todo, vals):
+    vals.append(builtin.function(*popAll(vals, len(node.args))))
+
+
+def memoize(node, env, data, todo, vals):
+    memo, key = data
+    memo.store(key, vals[-1])
+
+
+def construct(node, env, obj, todo, vals):
+    args = popAll(vals, len(node.args))
+    newEnv = obj.constructorEnv([obj] + args, env)
+    todo.append((constructed, node, newEnv, obj))
+    push(todo, obj.constructorClosure().expr, newEnv)
+
+
+def constructed(node, env, obj, todo, vals):
+    vals.pop()
+    obj.adopt(env['this'])
+    vals.append(obj)
+
+
+def evalBinary(node, env, data, todo, vals):
+    todo.append((binary, node, env, BINARY[type(node)]))
+    pushAll(todo, [node.left, node.right], env)
+
+
+def binary(node, env, op, todo, vals):
+    right = vals.pop()
+    vals[-1] = op(vals[-1], right)
+
+
+BINARY = {
+    Plus: add,
+    Minus: lambda a, b: a - b,
+    Times: lambda a, b: a * b,
+    Equals: lambda a, b: a == b,
+    NotEquals: lambda a, b: a != b,
+    Less: lambda a, b: a < b,
+    LessEq: lambda a, b: a <= b,
+    Greater: lambda a, b: a > b,
+    GreaterEq: lambda a, b: a >= b,
+}
+
+
+def evalShortCircuit(node, env, data, todo, vals):
+    todo.append((shortCircuit, node, env, None))
+    push(todo, node.left, env)
+
+
+def shortCircuit(node, env, data, todo, vals):
+    # And keeps a false left side, Or keeps a true one
+    if bool(vals[-1]) == isinstance(node, And):
+        vals.pop()
+        push(todo, node.right, env)
+
+
+def evalNot(node, env, data, todo, vals):
+    todo.append((not_, node, env, None))
+    push(todo, node.bexp, env)
+
+
+def not_(node, env, data, todo, vals):
+    vals[-1] = not vals[-1]
+
+
+def evalAssign(node, env, data, todo, vals):
+    todo.append((assign, node, env, None))
+    var = node.var
+    if isinstance(var, Var):
+        exps = []
+    elif isinstance(var, Dot):
+        exps = [var.obj]
+    elif isinstance(var, Index):
+        exps = [var.obj, var.ind]
+    else:
+        exps = bounds(var) + [var.obj]
+    pushAll(todo, exps + [node.exp], env)
+
+
+def assign(node, env, data, todo, vals):
+    var, newval = node.var, vals.pop()
+    if isinstance(node, AccessAssign) and isinstance(var, (Var, Dot)):
+        newval = newval, node.access
+    if isinstance(var, Var):
+        env[var.name] = newval
+    elif isinstance(var, Dot):
+        vals.pop()[var.attr.name] = newval
+    elif isinstance(var, Index):
+        ind = vals.pop()
+        vals.pop()[ind] = newval
+    else:
+        obj = vals.pop()
+        start, end = popBounds(var, vals)
+        obj[start:end] = newval
+    vals.append(())
+
+
+def evalBlock(node, env, data, todo, vals):
+    body = node.body
+    push(todo, body[-1], env)
+    for i in range(len(body) - 2, -1, -1):
+        todo.append((discard, node, env, None))
+        push(todo, body[i], env)
+
+
+def evalIf(node, env, data, todo, vals):
+    todo.append((branch, node, env, None))
+    push(todo, node.guard, env)
+
+
+def branch(node, env, data, todo, vals):
+    push(todo, node.beq if vals.pop() else node.bneq, env)
+
+
+def evalWhile(node, env, data, todo, vals):
+    # The loop item marks where break and continue unwind to
+    todo.append((loop, node, env, len(vals)))
+
+
+def loop(node, env, height, todo, vals):
+    todo.append((loopGuard, node, env, height))
+    push(todo, node.guard, env)
+
+
+def loopGuard(node, env, height, todo, vals):
+    if vals.pop():
+        todo.append((loop, node, env, height))
+        todo.append((discard, node, env, None))
+        push(todo, node.loop, env)
+    else:
+        vals.append(())
+
+
+def evalFor(node, env, data, todo, vals):
+    todo.append((startFor, node, env, None))
+    push(todo, node.iterable, env)
+
+
+def startFor(node, env, data, todo, vals):
+    vals.append(iterate(vals.pop()))
+    # The loop item marks where break and continue unwind to, just above the iterator
+    todo.append((nextFor, node, env, len(vals)))
+
+
+def nextFor(node, env, height, todo, vals):
+    try:
+        env[node.var.name] = next(vals[-1])
+    except StopIteration:
+        vals[-1] = ()
+        return
+    todo.append((nextFor, node, env, height))
+    todo.append((discard, node, env, None))
+    push(todo, node.loop, env)
+
+
+def unwind(todo, vals):
+    """
+    Pops todo back to the innermost loop item and vals back to its height
+
+    Returns the loop item
+    """
+    while todo[-1][0] is not loop and todo[-1][0] is not nextFor:
+        todo.pop()
+    item = todo[-1]
+    del vals[item[3]:]
+    return item
+
+
+def evalBreak(node, env, data, todo, vals):
+    if unwind(todo, vals)[0] is nextFor:
+        # Drop the iterator of the for loop
+        vals.pop()
+    todo.pop()
+    vals.append(())
+
+
+def evalContinue(node, env, data, todo, vals):
+    unwind(todo, vals)
+
+
+def evalPrint(node, env, data, todo, vals):
+    todo.append((print_, node, env, None))
+    push(todo, node.exp, env)
+
+
+def print_(node, env, data, todo, vals):
+    print(vals[-1])
+
+
+def evalTest(node, env, data, todo, vals):
+    todo.append((test, node, env, None))
+    push(todo, node.exp, env)
+
+
+def test(node, env, data, todo, vals):
+    assert vals.pop(), f'Test expression {node.exp} evaluated to false!'
+    vals.append(())
+
+
+HANDLERS = {
+    Int: evalValue,
+    String: evalValue,
+    Const: evalValue,
+    ConstCopy: evalCopy,
+    BTrue: constant(True),
+    BFalse: constant(False),
+    Null: constant(None),
+    Skip: constant(()),
+    List: evalList,
+    Tuple: evalTuple,
+    Dict: evalDict,
+    Var: evalVar,
+    Index: evalIndex,
+    Slice: evalSlice,
+    Class: evalClass,
+    Dot: evalDot,
+    Function: evalFunction,
+    AccessFunction: evalFunction,
+    AnonFunction: evalFunction,
+    App: evalApp,
+    Not: evalNot,
+    And: evalShortCircuit,
+    Or: evalShortCircuit,
+    Assign: evalAssign,
+    AccessAssign: evalAssign,
+    Block: evalBlock,
+    If: evalIf,
+    While: evalWhile,
+    For: evalFor,
+    Break: evalBreak,
+    Continue: evalContinue,
+    Print: evalPrint,
+    Test: evalTest,
+    Input: evalTree,
+}
+HANDLERS.update({op: evalBinary for op in BINARY})
@@ -0,0 +1,569 @@
+"""
+A compiler from OOMPH trees to nested Python closures
+
+Each node is turned into a function from a frame to a value once, so
+running the program does no dispatch on node types and builds no
+(value, env) tuples. Frames are lists laid out by oomphresolve, so
+variables are read by slot rather than looked up by name, and a call
+allocates a single frame instead of merging dictionaries. Function bodies
+return calls in tail position to their caller as TailFrames instead of
+making them, so tail recursion runs in constant Python stack.
+"""
+from ast import *
+from oomphresolve import resolve, UNBOUND
+
+
+class TailFrame(tuple):
+    """
+    A call in tail position, as the pair (code, frame) of the callee's body and the frame to run it in
+    """
+
+
+def finish(value):
+    """
+    Returns value, the result of running a function body, after making the tail calls it stands for
+    """
+    while type(value) == TailFrame:
+        code, frame = value
+        value = code(frame)
+    return value
+
+
+class Compiled(Expr):
+    """
+    A compiled function body, wrapping the Python closure made from its tree
+
+    Closures made by compiled code use this as their body, so they can still
+    be called by the tree walking evaluator and by Object constructors
+    """
+    __slots__ = ('code', 'source', 'scope', 'params', 'this')
+
+    def __init__(self, code, source, scope, params):
+        assert isinstance(source, Expr)
+        self.code = code
+        self.source = source
+        self.scope = scope
+        self.params = [scope.names[p.name] for p in params]
+        self.this = scope.names.get('this')
+
+    def eval(self, env):
+        frame = self.scope.frame(env)
+        return finish(self.code(frame)), self.scope.bindings(frame)
+
+    def callFrame(self, clos, vals, callerSuper, receiver):
+        """
+        Returns the frame this body runs in when clos is called, as Closure.callEnv
+        and Closure.methodEnv do
+
+        Parameter clos: the closure being called
+        Parameter vals: the values of the arguments, with the object first for a method
+        Parameter callerSuper: the value of super in the caller
+        Parameter receiver: the object a method was looked up on, None if this is not a method call
+        """
+        frame = [UNBOUND] * len(self.scope.names)
+        for slot, v in zip(self.params, vals):
+            frame[slot] = v
+        if receiver is not None:
+            if self.this not in self.params:
+                raise KeyError('this')
+            frame[self.this] = PrivateObject.of(frame[self.this])
+            if callerSuper is not UNBOUND:
+                superClass = callerSuper[1].superClass if callerSuper[1] else None
+            else:
+                superClass = receiver.superClass
+            frame[0] = (receiver, superClass)
+        names = self.scope.names
+        for name, v in clos.env.items():
+            slot = names.get(name)
+            if slot is not None:
+                frame[slot] = v
+        return frame
+
+    def constructorFrame(self, obj, vals, caller, callerScope):
+        """
+        Returns the frame this body runs in as the constructor of obj, as Object.constructorEnv does
+
+        Parameter obj: the object being constructed
+        Parameter vals: the values of the arguments, starting with obj
+        Parameter caller: the frame of the caller
+        Parameter callerScope: the scope of the caller
+        """
+        # Constructors see the variables of their caller, and those it does not have where the class was defined
+        frame = [UNBOUND] * len(self.scope.names)
+        outer = obj.cls.outer
+        for name, slot in self.scope.names.items():
+            callerSlot = callerScope.names.get(name)
+            if callerSlot is not None and caller[callerSlot] is not UNBOUND:
+                frame[slot] = caller[callerSlot]
+            elif name in outer:
+                frame[slot] = outer[name]
+        for slot, v in zip(self.params, vals):
+            frame[slot] = v
+        if self.this not in self.params:
+            raise KeyError('this')
+        frame[self.this] = PrivateObject.of(frame[self.this])
+        frame[0] = (obj, obj.superClass)
+        return frame
+
+    def __str__(self):
+        return str(self.source)
+
+
+def run(tree, env):
+    """
+    Compiles tree and runs it in env
+
+    Returns the same (value, variableBindings) configuration as tree.eval(env)
+    """
+    resolution = resolve(tree, env)
+    frame = resolution.root.frame(env)
+    value = compileExpr(tree, resolution.root, resolution)(frame)
+    env.update(resolution.root.bindings(frame))
+    return value, env
+
+
+def compileExpr(expr, scope, resolution):
+    """
+    Returns a Python function taking a frame and returning the value of expr
+
+    Parameter expr: the expression to compile
+    Parameter scope: the scope expr is evaluated in
+    Parameter resolution: the resolution of the program expr is part of
+    """
+    compiler = COMPILERS.get(type(expr))
+    if compiler is None:
+        return compileTree(expr, scope, resolution)
+    return compiler(expr, scope, resolution)
+
+
+def compileTail(expr, scope, resolution):
+    """
+    Returns the same as compileExpr, except that a call expr ends with is returned as a TailFrame
+
+    Parameter expr: the expression to compile, which is the last thing a function body evaluates
+    """
+    compiler = TAIL_COMPILERS.get(type(expr))
+    if compiler is None:
+        return compileExpr(expr, scope, resolution)
+    return compiler(expr, scope, resolution)
+
+
+def compileTree(node, scope, resolution):
+    # Anything we don't know about is walked in an environment made from the frame
+    def tree(frame):
+        v, env = node.eval(scope.bindings(frame))
+        for name, slot in scope.names.items():
+            frame[slot] = env.get(name, UNBOUND)
+        return v
+    return tree
+
+
+def compileAll(exprs, scope, resolution):
+    return [compileExpr(e, scope, resolution) for e in exprs]
+
+
+def compileBody(node, resolution):
+    scope = resolution.scope(node)
+    return Compiled(compileTail(node.exp, scope, resolution), node.exp, scope, node.args)
+
+
+def constant(value):
+    return lambda frame: value
+
+
+def copied(value):
+    copy = value.copy
+    return lambda frame: copy()
+
+
+def compileList(node, scope, resolution):
+    codes = compileAll(node.value, scope, resolution)
+    return lambda frame: [c(frame) for c in codes]
+
+
+def compileTuple(node, scope, resolution):
+    codes = compileAll(node.value, scope, resolution)
+    return lambda frame: tuple([c(frame) for c in codes])
+
+
+def compileDict(node, scope, resolution):
+    codes = [(compileExpr(k, scope, resolution), compileExpr(v, scope, resolution)) for k, v in node.keyvals]
+    return lambda frame: {k(frame): v(frame) for k, v in codes}
+
+
+def compileVar(node, scope, resolution):
+    name, slot = node.name, scope.names[node.name]
+
+    def var(frame):
+        v = frame[slot]
+        if v is UNBOUND:
+            builtin = BUILTINS.get(name)
+            if builtin is None:
+                raise UnboundVariable(name, node)
+            return builtin
+        return v
+    return var
+
+
+def compileIndex(node, scope, resolution):
+    obj, ind = compileAll([node.obj, node.ind], scope, resolution)
+
+    def index(frame):
+        o, i = obj(frame), ind(frame)
+        assert type(o) in INDEXABLE, 'Can only index a string or list'
+        return o[i]
+    return index
+
+
+def compileBounds(node, scope, resolution):
+    start = compileExpr(node.start, scope, resolution) if node.start is not None else constant(None)
+    end = compileExpr(node.end, scope, resolution) if node.end is not None else constant(None)
+    return start, end
+
+
+def compileSlice(node, scope, resolution):
+    obj = compileExpr(node.obj, scope, resolution)
+    start, end = compileBounds(node, scope, resolution)
+
+    def slice_(frame):
+        o, s, e = obj(frame), start(frame), end(frame)
+        assert type(o) in SLICEABLE, 'Not a sliceable item'
+        assert (type(s) == int or s is None) and (type(e) == int or e is None), "Slice indices must be integers"
+        return o[s:e]
+    return slice_
+
+
+def compileBlock(node, scope, resolution, tail=False):
+    *init, last = statements(node)
+    init = compileAll(init, scope, resolution)
+    last = (compileTail if tail else compileExpr)(last, scope, resolution)
+
+    def seq(frame):
+        for c in init:
+            c(frame)
+        return last(frame)
+    return seq
+
+
+def compileClass(node, scope, resolution):
+    name, slot = node.name.name, scope.names[node.name.name]
+    superName = node.superClass.name if node.superClass is not None else None
+    superSlot = scope.names[superName] if superName is not None else None
+    members = resolution.scope(node)
+    codes = [(isinstance(m, Function), compileExpr(m, members, resolution)) for m in statements(node.body)]
+    # The (name, slot) pairs of scope the constructor may read
+    outer = [(n, scope.names[n]) for n in node.capturedNames()]
+
+    def cls(frame):
+        if superSlot is not None:
+            superClass = frame[superSlot]
+            if superClass is UNBOUND:
+                raise KeyError(superName)
+        else:
+            superClass = None
+        classVars, methods = {}, {}
+        for isMethod, code in codes:
+            # Members are evaluated on their own, just like Class.destructBody
+            memberFrame = [UNBOUND] * len(members.names)
+            code(memberFrame)
+            (methods if isMethod else classVars).update(members.bindings(memberFrame))
+        classInfo = ClassInfo(name, classVars, methods, superClass,
+                              {n: frame[s] for n, s in outer if frame[s] is not UNBOUND})
+        frame[slot] = classInfo
+        return classInfo
+    return cls
+
+
+def compileDot(node, scope, resolution):
+    obj = compileExpr(node.obj, scope, resolution)
+    return lambda frame: node.lookup(obj(frame))
+
+
+def captures(node, scope, resolution):
+    """
+    Returns the (name, slot) pairs of scope that a closure made by node copies
+    """
+    return [(name, scope.names[name]) for name in resolution.scope(node).names]
+
+
+def compileFunction(node, scope, resolution):
+    name, slot, args = node.name.name, scope.names[node.name.name], node.args
+    body, captured = compileBody(node, resolution), captures(node, scope, resolution)
+    access = node.access if isinstance(node, AccessFunction) else None
+
+    def function(frame):
+        clos = node.closure(body, {n: frame[s] for n, s in captured if frame[s] is not UNBOUND})
+        binding = clos if access is None else (clos, access)
+        clos.env[name] = binding
+        frame[slot] = binding
+        return clos
+    return function
+
+
+def compileAnonFunction(node, scope, resolution):
+    args, body, captured = node.args, compileBody(node, resolution), captures(node, scope, resolution)
+    return lambda frame: Closure(body, args, {n: frame[s] for n, s in captured if frame[s] is not UNBOUND})
+
+
+def compileApp(node, scope, resolution, tail=False):
+    codes = compileAll(node.args, scope, resolution)
+
+    if type(node.func) == Dot:
+        # Call methods directly rather than through a MethodClosure
+        obj = compileExpr(node.func.obj, scope, resolution)
+
+        def app(frame):
+            clos, receiver = node.func.resolve(obj(frame))
+            if receiver is None:
+                return apply(clos, frame)
+            return call(clos, receiver, frame)
+    else:
+        func = compileExpr(node.func, scope, resolution)
+
+        def app(frame):
+            return apply(func(frame), frame)
+
+    def apply(clos, frame):
+        if isinstance(clos, tuple):
+            clos, _ = clos
+        if isinstance(clos, Closure):
+            return call(clos, clos.obj if isinstance(clos, MethodClosure) else None, frame)
+        if isinstance(clos, ClassInfo):
+            return construct(clos, frame)
+        if type(clos) == Builtin:
+            return clos.function(*[c(frame) for c in codes])
+        raise NotAFunction(node.func)
+
+    def call(clos, receiver, frame):
+        isMethod = receiver is not None
+        if len(clos.args) != len(codes) + isMethod:
+            raise TypeError("Number of arguments does not match number of parameters")
+        vals = [c(frame) for c in codes]
+        if isMethod:
+            vals.insert(0, receiver.eval(None)[0])
+        body = clos.expr
+        if type(body) == Compiled:
+            callFrame = body.callFrame(clos, vals, frame[0], receiver)
+            if clos.memo is not None and not isMethod:
+                return clos.memo.call(vals, lambda: finish(body.code(callFrame)))
+            if tail:
+                return TailFrame((body.code, callFrame))
+            value = body.code(callFrame)
+            while type(value) == TailFrame:
+                code, callFrame = value
+                value = code(callFrame)
+            return value
+        callerEnv = {'super': frame[0]} if frame[0] is not UNBOUND else {}
+        if isMethod:
+            return body.eval(clos.methodEnv(receiver, vals, callerEnv))[0]
+        if clos.memo is not None:
+            return clos.memo.call(vals, lambda: body.eval(clos.callEnv(vals, callerEnv))[0])
+        return body.eval(clos.callEnv(vals, callerEnv))[0]
+
+    def construct(cls, frame):
+        obj = Object(cls)
+        if not obj.constructor:
+            if len(codes) > 0:
+                raise TypeError("Constructor takes no arguments")
+            return obj
+        constructor = obj.constructorClosure()
+        if len(constructor.args) != len(codes) + 1:
+            raise TypeError("Invalid number of arguments for constructor call")
+        vals = [obj] + [c(frame) for c in codes]
+        body = constructor.expr
+        if type(body) == Compiled:
+            newFrame = body.constructorFrame(obj, vals, frame, scope)
+            finish(body.code(newFrame))
+            obj.adopt(newFrame[body.this])
+        else:
+            _, newEnv = body.eval(obj.constructorEnv(vals, scope.bindings(frame)))
+            obj.adopt(newEnv['this'])
+        return obj
+    return app
+
+
+BINARY = {
+    Plus: lambda l, r: lambda frame: add(l(frame), r(frame)),
+    Minus: lambda l, r: lambda frame: l(frame) - r(frame),
+    Times: lambda l, r: lambda frame: l(frame) * r(frame),
+    Equals: lambda l, r: lambda frame: l(frame) == r(frame),
+    NotEquals: lambda l, r: lambda frame: l(frame) != r(frame),
+    Less: lambda l, r: lambda frame: l(frame) < r(frame),
+    LessEq: lambda l, r: lambda frame: l(frame) <= r(frame),
+    Greater: lambda l, r: lambda frame: l(frame) > r(frame),
+    GreaterEq: lambda l, r: lambda frame: l(frame) >= r(frame),
+    And: lambda l, r: lambda frame: l(frame) and r(frame),
+    Or: lambda l, r: lambda frame: l(frame) or r(frame),
+}
+
+
+def compileBinary(node, scope, resolution):
+    return BINARY[type(node)](*compileAll([node.left, node.right], scope, resolution))
+
+
+def compileTailShortCircuit(node, scope, resolution):
+    left, right = compileExpr(node.left, scope, resolution), compileTail(node.right, scope, resolution)
+    return BINARY[type(node)](left, right)
+
+
+def compileNot(node, scope, resolution):
+    bexp = compileExpr(node.bexp, scope, resolution)
+    return lambda frame: not bexp(frame)
+
+
+def compileInput(node, scope, resolution):
+    return lambda frame: int(input(">"))
+
+
+def compileAssign(node, scope, resolution):
+    exp = compileExpr(node.exp, scope, resolution)
+    access = node.access if isinstance(node, AccessAssign) else None
+
+    def store(val):
+        return val if access is None else (val, access)
+
+    if isinstance(node.var, Var):
+        slot = scope.names[node.var.name]
+
+        def assign(frame):
+            frame[slot] = store(exp(frame))
+            return ()
+    elif isinstance(node.var, Dot):
+        obj, attr = compileExpr(node.var.obj, scope, resolution), node.var.attr.name
+
+        def assign(frame):
+            o, newval = obj(frame), exp(frame)
+            o[attr] = store(newval)
+            return ()
+    elif isinstance(node.var, Index):
+        obj, ind = compileAll([node.var.obj, node.var.ind], scope, resolution)
+
+        def assign(frame):
+            o, i, newval = obj(frame), ind(frame), exp(frame)
+            o[i] = newval
+            return ()
+    else:
+        obj = compileExpr(node.var.obj, scope, resolution)
+        start, end = compileBounds(node.var, scope, resolution)
+
+        def assign(frame):
+            s, e = start(frame), end(frame)
+            o, newval = obj(frame), exp(frame)
+            o[s:e] = newval
+            return ()
+    return assign
+
+
+def compileIf(node, scope, resolution, tail=False):
+    guard = compileExpr(node.guard, scope, resolution)
+    beq, bneq = [(compileTail if tail else compileExpr)(c, scope, resolution) for c in (node.beq, node.bneq)]
+    return lambda frame: beq(frame) if guard(frame) else bneq(frame)
+
+
+def compileWhile(node, scope, resolution):
+    guard, loop = compileAll([node.guard, node.loop], scope, resolution)
+
+    def loop_(frame):
+        while guard(frame):
+            try:
+                loop(frame)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
+        return ()
+    return loop_
+
+
+def compileFor(node, scope, resolution):
+    slot = scope.names[node.var.name]
+    iterable, loop = compileAll([node.iterable, node.loop], scope, resolution)
+
+    def for_(frame):
+        for value in iterate(iterable(frame)):
+            frame[slot] = value
+            try:
+                loop(frame)
+            except BreakLoop:
+                break
+            except ContinueLoop:
+                continue
+        return ()
+    return for_
+
+
+def compileBreak(node, scope, resolution):
+    def break_(frame):
+        raise BreakLoop()
+    return break_
+
+
+def compileContinue(node, scope, resolution):
+    def continue_(frame):
+        raise ContinueLoop()
+    return continue_
+
+
+def compilePrint(node, scope, resolution):
+    exp = compileExpr(node.exp, scope, resolution)
+
+    def print_(frame):
+        v = exp(frame)
+        print(v)
+        return v
+    return print_
+
+
+def compileTest(node, scope, resolution):
+    exp = compileExpr(node.exp, scope, resolution)
+
+    def test(frame):
+        assert exp(frame), f'Test expression {node.exp} evaluated to false!'
+        return ()
+    return test
+
+
+COMPILERS = {
+    Int: lambda node, scope, resolution: constant(node.value),
+    String: lambda node, scope, resolution: constant(node.value),
+    Const: lambda node, scope, resolution: constant(node.value),
+    ConstCopy: lambda node, scope, resolution: copied(node.value),
+    BTrue: lambda node, scope, resolution: constant(True),
+    BFalse: lambda node, scope, resolution: constant(False),
+    Null: lambda node, scope, resolution: constant(None),
+    Skip: lambda node, scope, resolution: constant(()),
+    List: compileList,
+    Tuple: compileTuple,
+    Dict: compileDict,
+    Var: compileVar,
+    Index: compileIndex,
+    Slice: compileSlice,
+    Class: compileClass,
+    Dot: compileDot,
+    Function: compileFunction,
+    AccessFunction: compileFunction,
+    AnonFunction: compileAnonFunction,
+    App: compileApp,
+    Not: compileNot,
+    Input: compileInput,
+    Assign: compileAssign,
+    AccessAssign: compileAssign,
+    Block: compileBlock,
+    If: compileIf,
+    While: compileWhile,
+    For: compileFor,
+    Break: compileBreak,
+    Continue: compileContinue,
+    Print: compilePrint,
+    Test: compileTest,
+}
+COMPILERS.update({op: compileBinary for op in BINARY})
+
+# The compilers of the expressions a function body can end with a call in
+TAIL_COMPILERS = {
+    Block: lambda node, scope, resolution: compileBlock(node, scope, resolution, True),
+    If: lambda node, scope, resolution: compileIf(node, scope, resolution, True),
+    App: lambda node, scope, resolution: compileApp(node, scope, resolution, True),
+    And: compileTailShortCircuit,
+    Or: compileTailShortCircuit,
+}
@@ -1,10 +1,13 @@
+import sys
+import threading
 from ply import lex
+import oomphcache
 
 # Reserved words
 reserved = (
     'TRUE', 'FALSE', 'NOT', 'AND', 'OR', 'SKIP', 'BREAK', 'CONTINUE', 'IF', 'ELSE', 
-    'WHILE', 'TEST', 'INPUT', 'PRINT', 'DEF', 'CLASS', 'FUN', 'STATIC', 'PRIVATE',
-    'PUBLIC', 'PROTECTED', 'NULL',
+    'WHILE', 'FOR', 'IN', 'TEST', 'INPUT', 'PRINT', 'DEF', 'CLASS', 'FUN', 'STATIC', 'PRIVATE',
+    'PUBLIC', 'PROTECTED', 'NULL', 'PURE',
 )
 
 tokens = reserved + (
@@ -77,12 +80,16 @@ for r in reserved:
 def t_QUOTE(t):
     r'\'[^\']*\''
     t.type = 'STRING'
+    # Strings can run over several lines
+    t.lexer.lineno += t.value.count('\n')
     return t
 
 
 def t_DUBQUOTE(t):
     r'\"[^\"]*\"'
     t.type = 'STRING'
+    # Strings can run over several lines
+    t.lexer.lineno += t.value.count('\n')
     return t
 
 
@@ -104,7 +111,45 @@ def t_error(t):
     t.lexer.skip(1)
 
 
-lexer = lex.lex()
-lexer.end = False
+_lock = threading.Lock()
+_lexer = None
+
+
+def getLexer():
+    """
+    Returns the master lexer, loading its tables from the cache the first time
+
+    Lexers hold the position in their input, so call clone() on the master to get one to lex with
+    """
+    global _lexer
+    if _lexer is None:
+        with _lock:
+            if _lexer is None:
+                _lexer = buildLexer()
+    return _lexer
+
+
+def buildLexer():
+    module = sys.modules[__name__]
+    name = 'lextab_' + oomphcache.version('oomphlex')
+    tables = oomphcache.loadModule(name)
+    if tables is not None:
+        lexer = lex.lex(module=module, optimize=1, lextab=tables)
+    else:
+        built = []
+        oomphcache.publish(lambda out: built.append(lex.lex(module=module, optimize=1, lextab=name, outputdir=out)),
+                           name + '.py')
+        lexer = built[0] if built else lex.lex(module=module)
+    lexer.end = False
+    return lexer
+
+
+def __getattr__(name):
+    # The lexer used to be built on import
+    if name == 'lexer':
+        return getLexer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 if __name__ == "__main__":
-    lex.runmain(lexer)
+    lex.runmain(getLexer())
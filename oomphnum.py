@@ -0,0 +1,216 @@
+"""
+Numeric arrays for OOMPH: fixed length sequences of integers with elementwise arithmetic
+
+An Array keeps 64 bit integers in one block of memory, in a NumPy array
+when NumPy is installed and in an array.array otherwise. +, - and * apply
+to each element, pairing up the elements of two arrays of the same length
+or combining every element with an integer, and the comparisons give an
+array with 1 where they hold and 0 where they do not. Every engine runs
+them unchanged, since the nodes apply Python's operators to their values.
+Indexing gives an element, and slicing gives a view sharing the elements
+of the array it was taken from, so assigning to one changes the other.
+
+Results that do not fit in 64 bits raise OverflowError with either one,
+rather than wrapping around as NumPy's own integers do, so a program gives
+the same results whether or not NumPy is installed.
+"""
+import array
+import functools
+import itertools
+import operator
+
+
+# Signed 64 bit integers, as array.array calls them
+TYPECODE = 'q'
+LIMIT = 2 ** 63
+
+# Whether arrays use NumPy when it is installed, which test.py turns off to check arrays without it
+USE_NUMPY = True
+
+
+def numpy():
+    """
+    Returns the numpy module, or None if it is not installed or USE_NUMPY is false
+    """
+    return importNumpy() if USE_NUMPY else None
+
+
+@functools.lru_cache(maxsize=None)
+def importNumpy():
+    """
+    Returns the numpy module, or None if it is not installed
+
+    It is only imported once an array is made, since importing it takes longer than starting the interpreter.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class Array:
+    __slots__ = ('values',)
+
+    def __init__(self, values):
+        # A memoryview of an array.array, or a NumPy array
+        self.values = values
+
+    @classmethod
+    def of(cls, values):
+        """
+        Returns a new Array holding the integers values, an iterable
+        """
+        # array.array checks the values are integers that fit, which NumPy does not
+        block = array.array(TYPECODE, values)
+        np = numpy()
+        if np is not None:
+            return cls(np.frombuffer(block, dtype=np.int64))
+        return cls(memoryview(block))
+
+    def combine(self, other, op):
+        """
+        Returns the Array of op applied to each element and the matching element of other,
+        or other itself if it is an integer
+
+        Parameter op: a function of two integers that also works on two NumPy arrays
+        """
+        if type(other) == Array:
+            if len(other) != len(self):
+                raise ValueError(f"Can not combine arrays of lengths {len(self)} and {len(other)}")
+            right = other.values
+        elif type(other) in (int, bool):
+            right = other
+        else:
+            return NotImplemented
+        if type(self.values) != memoryview:
+            values = op(self.values, right)
+            if values.dtype != bool:
+                self.checkRange(op, right)
+            return Array(values.astype(self.values.dtype, copy=False))
+        if type(right) != memoryview:
+            right = itertools.repeat(right)
+        return Array(memoryview(array.array(TYPECODE, map(op, self.values, right))))
+
+    def checkRange(self, op, right):
+        """
+        Raises OverflowError, as array.array does, if op applied to the elements of this NumPy array
+        and right gives a result that does not fit in 64 bits, which NumPy would wrap around
+
+        Parameter op: +, - or * on two integers, either way round
+        Parameter right: a NumPy array of the same length, or an integer
+        """
+        if not len(self.values):
+            return
+        # No sum, difference or product of numbers no bigger than these is bigger than this bound
+        left = largest(self.values)
+        other = largest(right) if type(right) not in (int, bool) else abs(right)
+        if max(left + other, left * other) < LIMIT:
+            return
+        # Only when the bound is too loose to tell are the results worked out exactly
+        exact = op(self.values.astype(object), right.astype(object) if type(right) not in (int, bool) else right)
+        if not all(-LIMIT <= v < LIMIT for v in exact):
+            raise OverflowError("int too big to convert")
+
+    def __add__(self, other):
+        return self.combine(other, operator.add)
+
+    def __radd__(self, other):
+        return self.combine(other, operator.add)
+
+    def __sub__(self, other):
+        return self.combine(other, operator.sub)
+
+    def __rsub__(self, other):
+        return self.combine(other, lambda a, b: b - a)
+
+    def __mul__(self, other):
+        return self.combine(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self.combine(other, operator.mul)
+
+    def __eq__(self, other):
+        return self.combine(other, operator.eq)
+
+    def __ne__(self, other):
+        return self.combine(other, operator.ne)
+
+    def __lt__(self, other):
+        return self.combine(other, operator.lt)
+
+    def __le__(self, other):
+        return self.combine(other, operator.le)
+
+    def __gt__(self, other):
+        return self.combine(other, operator.gt)
+
+    def __ge__(self, other):
+        return self.combine(other, operator.ge)
+
+    # Comparing arrays gives an array, so they can not be dictionary keys
+    __hash__ = None
+
+    def __bool__(self):
+        # Like NumPy, rather than being true whenever it is not empty, which would make test(a = b) always pass
+        raise TypeError("An array is neither true nor false, use all or any on it")
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values.tolist())
+
+    def __getitem__(self, index):
+        if type(index) == slice:
+            return Array(self.values[index])
+        return int(self.values[index])
+
+    def __setitem__(self, index, value):
+        if type(index) != slice:
+            if type(value) == int and not -LIMIT <= value < LIMIT:
+                # Which NumPy and memoryview would each report differently
+                raise OverflowError("int too big to convert")
+            self.values[index] = value
+            return
+        length = len(self.values[index])
+        if type(value) in (int, bool):
+            value = Array.of(itertools.repeat(value, length))
+        elif type(value) in (list, tuple):
+            value = Array.of(value)
+        elif type(value) != Array:
+            raise TypeError("Can only assign an integer, a list, a tuple or an array to a slice of an array")
+        if len(value) != length:
+            raise ValueError(f"Can not assign {len(value)} elements to a slice of {length}")
+        self.values[index] = value.values
+
+    def sum(self):
+        if type(self.values) == memoryview:
+            return sum(self.values)
+        if len(self.values) and len(self.values) * largest(self.values) >= LIMIT:
+            # NumPy's sum would wrap around, where Python's gives the whole number as it does without NumPy
+            return sum(self.values.tolist())
+        return int(self.values.sum())
+
+    def min(self):
+        return int(self.values.min()) if type(self.values) != memoryview else min(self.values)
+
+    def max(self):
+        return int(self.values.max()) if type(self.values) != memoryview else max(self.values)
+
+    def all(self):
+        return bool(self.values.all()) if type(self.values) != memoryview else all(self.values)
+
+    def any(self):
+        return bool(self.values.any()) if type(self.values) != memoryview else any(self.values)
+
+    def __repr__(self):
+        return f"array({self.values.tolist()})"
+
+
+def largest(values):
+    """
+    Returns the largest absolute value of the elements of the non-empty NumPy array values, as an int
+    """
+    # abs would wrap the smallest 64 bit integer around to itself
+    return max(-int(values.min()), int(values.max()))
@@ -0,0 +1,161 @@
+"""
+An optimizer pass rewriting OOMPH trees before they are run
+
+optimize folds operators whose operands are all constants, drops the
+branch of an If that can never be taken and loops that never run, and
+turns literals made only of constants into Const nodes, so they are not
+rebuilt every time they are evaluated. The result of running the
+optimized tree is always the same as running the original one:
+anything that would raise when evaluated is left alone, to raise at the
+same point at run time.
+"""
+import operator
+from ast import *
+
+
+FOLDS = {
+    Plus: operator.add,
+    Minus: operator.sub,
+    Times: operator.mul,
+    Equals: operator.eq,
+    NotEquals: operator.ne,
+    Less: operator.lt,
+    LessEq: operator.le,
+    Greater: operator.gt,
+    GreaterEq: operator.ge,
+}
+
+# Folded strings and tuples longer than this, and integers with more bits, are left to be computed when run
+MAX_SIZE = 4096
+
+# The value of each kind of constant node
+CONSTANTS = {
+    Int: lambda node: node.value,
+    String: lambda node: node.value,
+    Const: lambda node: node.value,
+    BTrue: lambda node: True,
+    BFalse: lambda node: False,
+    Null: lambda node: None,
+    Skip: lambda node: (),
+}
+
+# Marks a node whose value is not known before running it
+UNKNOWN = object()
+
+
+def value(node):
+    """
+    Returns the value node always evaluates to, or UNKNOWN
+    """
+    constant = CONSTANTS.get(type(node))
+    return UNKNOWN if constant is None else constant(node)
+
+
+def node(v):
+    """
+    Returns a node evaluating to the immutable value v, or None if it is too large to be worth storing
+    """
+    if type(v) == bool:
+        return BTrue() if v else BFalse()
+    if type(v) == int:
+        return Int(v) if v.bit_length() <= MAX_SIZE else None
+    if type(v) == str:
+        return String(v) if len(v) <= MAX_SIZE else None
+    if v is None:
+        return Null()
+    return Const(v) if len(v) <= MAX_SIZE else None
+
+
+def tooLong(left, right):
+    """
+    Returns whether repeating a string or tuple would be too large to fold, checked before building it
+    """
+    for seq, times in ((left, right), (right, left)):
+        if type(seq) in (str, tuple) and type(times) in (int, bool):
+            return len(seq) * times > MAX_SIZE
+    return False
+
+
+def fold(e):
+    """
+    Returns a node equivalent to e, whose subexpressions have already been optimized
+    """
+    kind = type(e)
+    if kind in FOLDS:
+        left, right = value(e.left), value(e.right)
+        if left is UNKNOWN or right is UNKNOWN:
+            return e
+        if kind == Times and tooLong(left, right):
+            return e
+        try:
+            return node(FOLDS[kind](left, right)) or e
+        except Exception:
+            # Like 1 + "a", which must still fail when it is run
+            return e
+    if kind == Not:
+        bexp = value(e.bexp)
+        return e if bexp is UNKNOWN else node(not bexp)
+    if kind == And or kind == Or:
+        left = value(e.left)
+        if left is UNKNOWN:
+            return e
+        if bool(left) == (kind == Or):
+            # The right side is never evaluated
+            return e.left
+        right = value(e.right)
+        return e if right is UNKNOWN else e.right
+    if kind == If:
+        guard = value(e.guard)
+        if guard is UNKNOWN:
+            return e
+        return e.beq if guard else e.bneq
+    if kind == While:
+        guard = value(e.guard)
+        return Skip() if guard is not UNKNOWN and not guard else e
+    if kind == For:
+        iterable = e.iterable.value if type(e.iterable) in (String, Const, ConstCopy) else None
+        # Anything but an empty collection either runs the loop or must still fail when it is run
+        return Skip() if type(iterable) in (str, tuple, list, dict) and not iterable else e
+    if kind == Tuple:
+        values = tuple(value(elt) for elt in e.value)
+        return (node(values) or e) if all(v is not UNKNOWN for v in values) else e
+    if kind == List:
+        values = [value(elt) for elt in e.value]
+        return ConstCopy(values) if all(v is not UNKNOWN for v in values) else e
+    if kind == Dict:
+        pairs = [(value(k), value(v)) for k, v in e.keyvals]
+        if any(k is UNKNOWN or v is UNKNOWN for k, v in pairs):
+            return e
+        return ConstCopy(dict(pairs))
+    return e
+
+
+def optimize(tree):
+    """
+    Returns an optimized version of tree, a program as returned by oomphparse.parse
+
+    The nodes of tree are changed in place, so tree itself should not be run afterwards.
+    """
+    # Every node before its subexpressions, so that in reverse they are folded bottom up
+    order, todo = [], [tree]
+    while todo:
+        e = todo.pop()
+        order.append(e)
+        todo.extend(e.children())
+    folded = {}
+
+    def replace(field):
+        if isinstance(field, Expr):
+            return folded.get(id(field), field)
+        if type(field) == list:
+            return [replace(f) for f in field]
+        if type(field) == tuple:
+            return tuple(replace(f) for f in field)
+        return field
+
+    for e in reversed(order):
+        for name in e.fields:
+            setattr(e, name, replace(getattr(e, name)))
+        # Nodes made by folding start where the expression they replace does
+        folded[id(e)] = fold(e).locate(e)
+    return folded[id(tree)]
@@ -1,4 +1,8 @@
+import os
+import sys
+import threading
 from ply import yacc
+import oomphcache
 from ast import *
 import oomphlex
 
@@ -25,9 +29,25 @@ precedence = (
 # Programs
 def p_program(p):
     'p : c'
+    checkLoops(p[1])
     p[0] = p[1]
 
 
+def at(p, node, n=1):
+    """
+    Returns node, after recording where in the program it starts: where symbol n of the rule p matched does
+
+    Nodes that already have a position, like the inside of parentheses, keep it.
+    """
+    if node.line is None:
+        pos = p.lexpos(n)
+        lineStart = p.lexer.lexdata.rfind('\n', 0, pos)
+        node.line = p.lineno(n)
+        # The first line may not start at the start of a line of the whole program
+        node.column = pos - lineStart if lineStart >= 0 else pos + p.lexer.column
+    return node
+
+
 # Arithmetic Expressions
 def p_c_aexp(p):
     '''
@@ -36,11 +56,11 @@ def p_c_aexp(p):
       | c TIMES c
     '''
     if p[2] == '+':
-        p[0] = Plus(p[1], p[3])
+        p[0] = at(p, Plus(p[1], p[3]))
     elif p[2] == '-':
-        p[0] = Minus(p[1], p[3])
+        p[0] = at(p, Minus(p[1], p[3]))
     elif p[2] == '*':
-        p[0] = Times(p[1], p[3])
+        p[0] = at(p, Times(p[1], p[3]))
 
 
 def p_c_parens(p):
@@ -56,9 +76,9 @@ def p_vars_fun(p):
          | VAR COMMA vars
     '''
     if len(p) == 2:
-        p[0] = [Var(p[1])]
+        p[0] = [at(p, Var(p[1]))]
     else:
-        p[0] = [Var(p[1])] + p[3]
+        p[0] = [at(p, Var(p[1]))] + p[3]
 
 
 def p_var_no_comma(p):
@@ -67,51 +87,65 @@ def p_var_no_comma(p):
           | VAR vars
     '''
     if len(p) == 2:
-        p[0] = [Var(p[1])]
+        p[0] = [at(p, Var(p[1]))]
     else:
-        p[0] = [Var(p[1])] + p[2]
+        p[0] = [at(p, Var(p[1]))] + p[2]
 
 
 def p_c_anon(p):
     '''
     c : FUN var_c ARROW c
     '''
-    p[0] = AnonFunction(p[2], p[4])
+    p[0] = at(p, AnonFunction(p[2], p[4]))
 
 
 def p_c_empty_anon(p):
     '''
     c : FUN LPAREN RPAREN ARROW c
     '''
-    p[0] = AnonFunction([], p[5])
+    p[0] = at(p, AnonFunction([], p[5]))
 
 
 def p_c_empty_func(p):
     '''
     c : DEF VAR LPAREN RPAREN COLON LCURL c RCURL
     '''
-    p[0] = Function(Var(p[2]), [], p[7])
+    p[0] = at(p, Function(at(p, Var(p[2]), 2), [], p[7]))
 
 
 def p_c_func(p):
     '''
     c : DEF VAR LPAREN vars RPAREN COLON LCURL c RCURL
     '''
-    p[0] = Function(Var(p[2]), p[4], p[8])
+    p[0] = at(p, Function(at(p, Var(p[2]), 2), p[4], p[8]))
+
+
+def p_c_empty_pure_func(p):
+    '''
+    c : DEF PURE VAR LPAREN RPAREN COLON LCURL c RCURL
+    '''
+    p[0] = at(p, Function(at(p, Var(p[3]), 3), [], p[8], pure=True))
+
+
+def p_c_pure_func(p):
+    '''
+    c : DEF PURE VAR LPAREN vars RPAREN COLON LCURL c RCURL
+    '''
+    p[0] = at(p, Function(at(p, Var(p[3]), 3), p[5], p[9], pure=True))
 
 
 def p_c_empty_public_fun(p):
     '''
     c : DEF PUBLIC VAR LPAREN RPAREN COLON LCURL c RCURL
     '''
-    p[0] = AccessFunction(Var(p[3]), [], p[8], PrivacyMod.PUBLIC)
+    p[0] = at(p, AccessFunction(at(p, Var(p[3]), 3), [], p[8], PrivacyMod.PUBLIC))
 
 
 def p_c_empty_private_fun(p):
     '''
     c : DEF PRIVATE VAR LPAREN RPAREN COLON LCURL c RCURL
     '''
-    p[0] = AccessFunction(Var(p[3]), [], p[8], PrivacyMod.PRIVATE)
+    p[0] = at(p, AccessFunction(at(p, Var(p[3]), 3), [], p[8], PrivacyMod.PRIVATE))
 
 
 def p_c_empty_protected_fun(p):
@@ -126,35 +160,35 @@ def p_c_public_fun(p):
     '''
     c : DEF PUBLIC VAR LPAREN vars RPAREN COLON LCURL c RCURL
     '''
-    p[0] = AccessFunction(Var(p[3]), p[5], p[9], PrivacyMod.PUBLIC)
+    p[0] = at(p, AccessFunction(at(p, Var(p[3]), 3), p[5], p[9], PrivacyMod.PUBLIC))
 
 
 def p_c_private_fun(p):
     '''
     c : DEF PRIVATE VAR LPAREN vars RPAREN COLON LCURL c RCURL
     '''
-    p[0] = AccessFunction(Var(p[3]), p[5], p[9], PrivacyMod.PRIVATE)
+    p[0] = at(p, AccessFunction(at(p, Var(p[3]), 3), p[5], p[9], PrivacyMod.PRIVATE))
 
 
 def p_c_protected_fun(p):
     '''
     c : DEF PROTECTED VAR LPAREN vars RPAREN COLON LCURL c RCURL
     '''
-    p[0] = AccessFunction(Var(p[3]), p[5], p[9], PrivacyMod.PROTECTED)
+    p[0] = at(p, AccessFunction(at(p, Var(p[3]), 3), p[5], p[9], PrivacyMod.PROTECTED))
 
 
 def p_c_emptyApp(p):
     '''
     c : c LPAREN RPAREN
     '''
-    p[0] = App(p[1], [])
+    p[0] = at(p, App(p[1], []))
 
 
 def p_c_app(p):
     '''
     c : c LPAREN exps RPAREN
     '''
-    p[0] = App(p[1], p[3])
+    p[0] = at(p, App(p[1], p[3]))
 
 
 def p_exps_fun(p):
@@ -172,34 +206,34 @@ def p_c_class(p):
     '''
     c : CLASS VAR COLON LCURL c RCURL
     '''
-    p[0] = Class(Var(p[2]), p[5], None)
+    p[0] = at(p, Class(at(p, Var(p[2]), 2), p[5], None))
 
 def p_c_subclass(p):
     '''
     c : CLASS VAR LPAREN VAR RPAREN COLON LCURL c RCURL
     '''
-    p[0] = Class(Var(p[2]), p[8], Var(p[4]))
+    p[0] = at(p, Class(at(p, Var(p[2]), 2), p[8], at(p, Var(p[4]), 4)))
 
 
 def p_c_dot(p):
     '''
     c : c DOT VAR
     '''
-    p[0] = Dot(p[1], Var(p[3]))
+    p[0] = at(p, Dot(p[1], at(p, Var(p[3]), 3)))
 
 
 def p_c_emptyList(p):
     '''
     c : LBRACE RBRACE
     '''
-    p[0] = List([])
+    p[0] = at(p, List([]))
 
 
 def p_c_list(p):
     '''
     c : LBRACE exps RBRACE
     '''
-    p[0] = List(p[2])
+    p[0] = at(p, List(p[2]))
 
 def p_c_dictExps(p):
     '''
@@ -216,82 +250,82 @@ def p_c_emptyDict(p):
     '''
     c : LCURL RCURL
     '''
-    p[0] = Dict([])
+    p[0] = at(p, Dict([]))
 
 
 def p_c_dict(p):
     '''
     c : LCURL dexps RCURL
     '''
-    p[0] = Dict(p[2])
+    p[0] = at(p, Dict(p[2]))
 
 
 def p_c_emptyTuple(p):
     '''
     c : LPAREN COMMA RPAREN
     '''
-    p[0] = Tuple(tuple())
+    p[0] = at(p, Tuple(tuple()))
 
 
 def p_c_oneTuple(p):
     '''
     c : LPAREN c COMMA RPAREN
     '''
-    p[0] = Tuple((p[2],))
+    p[0] = at(p, Tuple((p[2],)))
 
 
 def p_c_tuple(p):
     '''
     c : LPAREN exps RPAREN
     '''
-    p[0] = Tuple(tuple(p[2]))
+    p[0] = at(p, Tuple(tuple(p[2])))
 
 def p_c_null(p):
     '''
     c : NULL
     '''
-    p[0] = Null()
+    p[0] = at(p, Null())
 
 def p_c_str(p):
     '''
     c : STRING
     '''
-    p[0] = String(p[1][1:-1])
+    p[0] = at(p, String(p[1][1:-1]))
 
 
 def p_c_index(p):
     '''
     c : c LBRACE c RBRACE
     '''
-    p[0] = Index(p[1], p[3])
+    p[0] = at(p, Index(p[1], p[3]))
 
 
 def p_c_slice(p):
     '''
     c : c LBRACE c COLON c RBRACE
     '''
-    p[0] = Slice(p[1], p[3], p[5])
+    p[0] = at(p, Slice(p[1], p[3], p[5]))
 
 
 def p_c_sliceEmpty(p):
     '''
     c : c LBRACE COLON RBRACE
     '''
-    p[0] = Slice(p[1], None, None)
+    p[0] = at(p, Slice(p[1], None, None))
 
 
 def p_c_sliceStart(p):
     '''
     c : c LBRACE c COLON RBRACE
     '''
-    p[0] = Slice(p[1], p[3], None)
+    p[0] = at(p, Slice(p[1], p[3], None))
 
 
 def p_c_sliceEnd(p):
     '''
     c : c LBRACE COLON c RBRACE
     '''
-    p[0] = Slice(p[1], None, p[4])
+    p[0] = at(p, Slice(p[1], None, p[4]))
 
 
 def p_c_int(p):
@@ -300,23 +334,23 @@ def p_c_int(p):
       | MINUS INT
     '''
     if type(p[1]) == str:
-        p[0] = Int(-p[2])
+        p[0] = at(p, Int(-p[2]))
     else:
-        p[0] = Int(p[1])
+        p[0] = at(p, Int(p[1]))
 
 
 def p_c_var(p):
     '''
     c : VAR
     '''
-    p[0] = Var(p[1])
+    p[0] = at(p, Var(p[1]))
 
 
 def p_c_input(p):
     '''
     c : INPUT
     '''
-    p[0] = Input()
+    p[0] = at(p, Input())
 
 
 # Boolean Expressions
@@ -330,17 +364,17 @@ def p_c_bexp(p):
       | c GREATEREQ c
     '''
     if p[2] == oomphlex.t_EQUALS:
-        p[0] = Equals(p[1], p[3])
+        p[0] = at(p, Equals(p[1], p[3]))
     elif p[2] == oomphlex.t_NOTEQUALS:
-        p[0] = NotEquals(p[1], p[3])
+        p[0] = at(p, NotEquals(p[1], p[3]))
     elif p[2] == oomphlex.t_LESS:
-        p[0] = Less(p[1], p[3])
+        p[0] = at(p, Less(p[1], p[3]))
     elif p[2] == oomphlex.t_LESSEQ:
-        p[0] = LessEq(p[1], p[3])
+        p[0] = at(p, LessEq(p[1], p[3]))
     elif p[2] == oomphlex.t_GREATER:
-        p[0] = Greater(p[1], p[3])
+        p[0] = at(p, Greater(p[1], p[3]))
     elif p[2] == oomphlex.t_GREATEREQ:
-        p[0] = GreaterEq(p[1], p[3])
+        p[0] = at(p, GreaterEq(p[1], p[3]))
 
 
 def p_c_binop(p):
@@ -349,16 +383,16 @@ def p_c_binop(p):
        | c AND c
     '''
     if p[2] == 'and':  # This feels wrong... any better way?
-        p[0] = And(p[1], p[3])
+        p[0] = at(p, And(p[1], p[3]))
     elif p[2] == 'or':
-        p[0] = Or(p[1], p[3])
+        p[0] = at(p, Or(p[1], p[3]))
 
 
 def p_c_unop(p):
     '''
     c : NOT c
     '''
-    p[0] = Not(p[2])
+    p[0] = at(p, Not(p[2]))
 
 
 def p_c_const(p):
@@ -367,9 +401,9 @@ def p_c_const(p):
        | FALSE
     '''
     if p[1] == 'true':
-        p[0] = BTrue()
+        p[0] = at(p, BTrue())
     elif p[1] == 'false':
-        p[0] = BFalse()
+        p[0] = at(p, BFalse())
 
 
 # Commands
@@ -377,21 +411,28 @@ def p_c_seq(p):
     '''
     c : c SEMI c
     '''
-    p[0] = Seq(p[1], p[3])
+    p[0] = at(p, sequence(p[1], p[3]))
 
 
 def p_c_if(p):
     '''
     c : IF LPAREN c RPAREN LCURL c RCURL ELSE LCURL c RCURL
     '''
-    p[0] = If(p[3], p[6], p[10])
+    p[0] = at(p, If(p[3], p[6], p[10]))
 
 
 def p_c_while(p):
     '''
     c : WHILE LPAREN c RPAREN LCURL c RCURL
     '''
-    p[0] = While(p[3], p[6])
+    p[0] = at(p, While(p[3], p[6]))
+
+
+def p_c_for(p):
+    '''
+    c : FOR VAR IN c LCURL c RCURL
+    '''
+    p[0] = at(p, For(at(p, Var(p[2]), 2), p[4], p[6]))
 
 
 def p_c_skip(p):
@@ -400,7 +441,12 @@ def p_c_skip(p):
     | BREAK
     | CONTINUE
     '''
-    p[0] = Skip()
+    if p[1] == 'skip':
+        p[0] = at(p, Skip())
+    elif p[1] == 'break':
+        p[0] = at(p, Break())
+    elif p[1] == 'continue':
+        p[0] = at(p, Continue())
 
 
 def p_c_units(p):
@@ -409,37 +455,37 @@ def p_c_units(p):
     | TEST LPAREN c RPAREN
     '''
     if p[1] == 'print':
-        p[0] = Print(p[3])
+        p[0] = at(p, Print(p[3]))
     elif p[1] == 'test':
-        p[0] = Test(p[3])
+        p[0] = at(p, Test(p[3]))
 
 
 def p_c_assign(p):
     '''
     c : c ASSIGN c
     '''
-    p[0] = Assign(p[1], p[3])
+    p[0] = at(p, Assign(p[1], p[3]))
 
 
 def p_c_public_assign(p):
     '''
     c : c PUBLIC ASSIGN c
     '''
-    p[0] = AccessAssign(p[1], p[4], PrivacyMod.PUBLIC)
+    p[0] = at(p, AccessAssign(p[1], p[4], PrivacyMod.PUBLIC))
 
 
 def p_c_private_assign(p):
     '''
     c : c PRIVATE ASSIGN c
     '''
-    p[0] = AccessAssign(p[1], p[4], PrivacyMod.PRIVATE)
+    p[0] = at(p, AccessAssign(p[1], p[4], PrivacyMod.PRIVATE))
 
 
 def p_c_protected_assign(p):
     '''
     c : c PROTECTED ASSIGN c
     '''
-    p[0] = AccessAssign(p[1], p[4], PrivacyMod.PROTECTED)
+    p[0] = at(p, AccessAssign(p[1], p[4], PrivacyMod.PROTECTED))
 
 
 def p_c_static_assign(p):
@@ -454,16 +500,64 @@ def p_error(p):
     if p:
         print("Syntax error at token", p.type)
         # Just discard the token and tell the parser it's okay.
-        parser.errok()
+        getParser().errok()
     else:
         print("Syntax error at EOF")
 
 
-parser = yacc.yacc()
+_lock = threading.Lock()
+_parser = None
+
+
+def getParser():
+    """
+    Returns the parser, loading its tables from the cache the first time
+    """
+    global _parser
+    if _parser is None:
+        with _lock:
+            if _parser is None:
+                _parser = buildParser()
+    return _parser
+
+
+def buildParser():
+    # Parsing without a lexer of its own uses the one built last
+    oomphlex.getLexer()
+    module = sys.modules[__name__]
+    # The tables are pickled rather than written as a module, so loading them compiles nothing
+    name = 'parsetab_' + oomphcache.version('oomphlex', 'oomphparse') + '.pickle'
+    if os.path.exists(oomphcache.path(name)):
+        return yacc.yacc(module=module, optimize=1, picklefile=oomphcache.path(name), debug=False)
+    built = []
+    oomphcache.publish(lambda out: built.append(yacc.yacc(module=module, optimize=1, picklefile=os.path.join(out, name),
+                                                          debug=False)), name)
+    return built[0] if built else yacc.yacc(module=module, debug=False, write_tables=False)
+
+
+def parse(prog, line=1, column=1):
+    """
+    Returns the tree of prog, a string holding an OOMPH program
+
+    Parameter line, column: the position prog starts at, when it is part of a larger program
+    """
+    lexer = oomphlex.getLexer().clone()
+    lexer.lineno = line
+    lexer.column = column
+    # Tracking gives the rules the positions of the expressions they are made of, not just of their tokens
+    return getParser().parse(prog, lexer=lexer, tracking=True)
+
+
+def __getattr__(name):
+    # The parser used to be built on import
+    if name == 'parser':
+        return getParser()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
     with open('input.oomph') as file:
         prog = file.read()
     print(prog)
-    result = parser.parse(prog)
+    result = parse(prog)
     print(result)
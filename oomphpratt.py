@@ -0,0 +1,490 @@
+"""
+A hand written precedence climbing parser for OOMPH
+
+parse builds the same ast.py trees as oomphparse.parse in a single pass
+over the tokens, without generating any tables. Where the PLY grammar is
+ambiguous, the choice PLY makes from oomphparse.precedence is made here
+too: an operator continues the expression being parsed if its token binds
+tighter than the rule the expression belongs to, so tokens with no
+precedence (like the '[' of an index) bind loosest of all, and x := l[0]
+is Index(x := l, 0) in both parsers.
+"""
+import gc
+import re
+from ast import *
+import oomphlex
+import oomphparse
+
+
+# Levels of the tokens given a precedence in oomphparse, from 1 for the loosest
+LEVELS = {}
+ASSOCS = {}
+for level, (assoc, *names) in enumerate(oomphparse.precedence, 1):
+    for name in names:
+        LEVELS[name] = level
+        ASSOCS[name] = assoc
+
+
+def rule(token):
+    """
+    Returns the (level, associativity) of a rule whose last token is token, as PLY assigns it
+    """
+    return LEVELS.get(token, 0), ASSOCS.get(token, 'right')
+
+
+BINARY = {
+    'PLUS': Plus,
+    'MINUS': Minus,
+    'TIMES': Times,
+    'EQUALS': Equals,
+    'NOTEQUALS': NotEquals,
+    'LESS': Less,
+    'LESSEQ': LessEq,
+    'GREATER': Greater,
+    'GREATEREQ': GreaterEq,
+    'AND': And,
+    'OR': Or,
+}
+
+ACCESS = {
+    'PUBLIC': PrivacyMod.PUBLIC,
+    'PRIVATE': PrivacyMod.PRIVATE,
+    'PROTECTED': PrivacyMod.PROTECTED,
+}
+
+# Tokens that can follow an expression and extend it
+OPERATORS = set(BINARY) | set(ACCESS) | {'SEMI', 'ASSIGN', 'STATIC', 'LPAREN', 'DOT', 'LBRACE'}
+
+# Tokens that can follow an expression and end it
+CLOSERS = {'RPAREN', 'RBRACE', 'RCURL', 'LCURL', 'COMMA', 'COLON', 'EOF'}
+
+CONSTANTS = {
+    'TRUE': BTrue,
+    'FALSE': BFalse,
+    'NULL': Null,
+    'SKIP': Skip,
+    'BREAK': Break,
+    'CONTINUE': Continue,
+    'INPUT': Input,
+}
+
+# The token rules of oomphlex, in the order PLY tries them: functions first, then strings longest first
+STRING_RULES = sorted(((name[2:], regex) for name, regex in vars(oomphlex).items()
+                       if name.startswith('t_') and type(regex) == str and name != 't_ignore'),
+                      key=lambda rule: len(rule[1]), reverse=True)
+# Each match skips the ignored characters before a token, which are mostly indentation
+TOKEN = re.compile(f'[{oomphlex.t_ignore}]*(?:' + '|'.join(f'(?P<{name}>{regex})' for name, regex in [
+    ('NEWLINE', oomphlex.t_NEWLINE.__doc__),
+    ('QUOTE', oomphlex.t_QUOTE.__doc__),
+    ('DUBQUOTE', oomphlex.t_DUBQUOTE.__doc__),
+    ('ID', oomphlex.t_ID.__doc__),
+    ('INT', oomphlex.t_INT.__doc__),
+] + STRING_RULES) + ')')
+
+
+def tokenize(prog, line=1, column=1):
+    """
+    Returns the (types, values, positions) of the tokens of prog, ending with an 'EOF' token
+
+    Positions are (line, column) pairs, both counted from 1.
+
+    Parameter line, column: the position prog starts at, when it is part of a larger program
+    """
+    types, values, positions = [], [], []
+    pos, end = 0, len(prog)
+    # Where the line pos is on starts
+    lineStart = 1 - column
+    match = TOKEN.match
+    while pos < end:
+        m = match(prog, pos)
+        if m is None:
+            while pos < end and prog[pos] in oomphlex.t_ignore:
+                pos += 1
+            if pos < end:
+                print("Illegal character %s" % repr(prog[pos]))
+                pos += 1
+            continue
+        kind = m.lastgroup
+        value = m.group(kind)
+        start, pos = m.start(kind), m.end()
+        if kind == 'NEWLINE':
+            line += len(value)
+            lineStart = pos
+            continue
+        positions.append((line, start - lineStart + 1))
+        if kind == 'ID':
+            kind = oomphlex.reserved_map.get(value, 'VAR')
+        elif kind == 'INT':
+            value = int(value)
+        elif kind == 'QUOTE' or kind == 'DUBQUOTE':
+            kind = 'STRING'
+            if '\n' in value:
+                line += value.count('\n')
+                lineStart = start + value.rfind('\n') + 1
+        types.append(kind)
+        values.append(value)
+    types.append('EOF')
+    values.append(None)
+    positions.append((line, pos - lineStart + 1))
+    return types, values, positions
+
+
+class ParseError(Exception):
+    """
+    Exception raised at the first token the grammar does not allow
+    """
+    def __init__(self, kind):
+        self.message = "Syntax error at EOF" if kind == 'EOF' else f"Syntax error at token {kind}"
+
+
+class Parser:
+    def __init__(self, prog, line=1, column=1):
+        self.types, self.values, self.positions = tokenize(prog, line, column)
+        self.pos = 0
+        # How many loops the token at pos is in, counted from the innermost function or class
+        self.loops = 0
+        # Whether a break or continue was found outside of a loop
+        self.stray = False
+
+    def peek(self):
+        return self.types[self.pos]
+
+    def next(self):
+        """
+        Consumes a token, returning its value
+        """
+        value = self.values[self.pos]
+        self.pos += 1
+        return value
+
+    def expect(self, kind):
+        """
+        Consumes a token of type kind, returning its value
+        """
+        if self.types[self.pos] != kind:
+            raise ParseError(self.types[self.pos])
+        return self.next()
+
+    def at(self, node, start):
+        """
+        Returns node, after recording that it starts at the token at start, unless it already has a position
+        """
+        if node is not None and node.line is None:
+            node.line, node.column = self.positions[start]
+        return node
+
+    def var(self):
+        start = self.pos
+        return self.at(Var(self.expect('VAR')), start)
+
+    def program(self):
+        tree = self.expr(None)
+        self.expect('EOF')
+        if self.stray or tree is None:
+            # Raises the same error as the PLY parser, which always walks the tree
+            checkLoops(tree)
+        return tree
+
+    def expr(self, context):
+        """
+        Parses an expression
+
+        Parameter context: the (level, associativity) of the rule this expression
+        is the last part of, None if it is followed by a closing token instead
+        """
+        start = self.pos
+        left = self.at(self.atom(), start)
+        types = self.types
+        while types[self.pos] in OPERATORS:
+            kind = types[self.pos]
+            if context is not None:
+                level, assoc = context
+                shift = LEVELS.get(kind, 0)
+                if shift < level or (shift == level and assoc == 'left'):
+                    break
+                if shift == level and assoc == 'nonassoc':
+                    raise ParseError(kind)
+            self.pos += 1
+            left = self.at(self.operator(kind, left), start)
+        else:
+            if types[self.pos] not in CLOSERS:
+                raise ParseError(types[self.pos])
+        return left
+
+    def operator(self, kind, left):
+        """
+        Parses the rest of an expression whose left side is left and whose operator token kind was just consumed
+        """
+        if kind in BINARY:
+            return BINARY[kind](left, self.expr(rule(kind)))
+        if kind == 'SEMI':
+            return sequence(left, self.expr(rule(kind)))
+        if kind == 'DOT':
+            return Dot(left, self.var())
+        if kind == 'LPAREN':
+            if self.peek() == 'RPAREN':
+                self.next()
+                return App(left, [])
+            args = self.exps()
+            self.expect('RPAREN')
+            return App(left, args)
+        if kind == 'LBRACE':
+            return self.index(left)
+        # Assignments
+        if kind != 'ASSIGN':
+            self.expect('ASSIGN')
+        right = self.expr(rule('ASSIGN'))
+        if kind == 'ASSIGN':
+            return Assign(left, right)
+        if kind == 'STATIC':
+            return None
+        return AccessAssign(left, right, ACCESS[kind])
+
+    def index(self, obj):
+        """
+        Parses an index or slice of obj, after its '['
+        """
+        start = end = None
+        if self.peek() != 'COLON':
+            start = self.expr(None)
+            if self.peek() == 'RBRACE':
+                self.next()
+                return Index(obj, start)
+        self.expect('COLON')
+        if self.peek() != 'RBRACE':
+            end = self.expr(None)
+        self.expect('RBRACE')
+        return Slice(obj, start, end)
+
+    def exps(self):
+        exps = [self.expr(None)]
+        while self.peek() == 'COMMA':
+            self.next()
+            exps.append(self.expr(None))
+        return exps
+
+    def vars(self):
+        names = [self.var()]
+        while self.peek() == 'COMMA':
+            self.next()
+            names.append(self.var())
+        return names
+
+    def block(self):
+        """
+        Parses { c }
+        """
+        self.expect('LCURL')
+        body = self.expr(None)
+        self.expect('RCURL')
+        return body
+
+    def scope(self, parse):
+        """
+        Returns parse(), a function or class body, which is not in the loops around it
+        """
+        loops, self.loops = self.loops, 0
+        body = parse()
+        self.loops = loops
+        return body
+
+    def parenthesized(self):
+        self.expect('LPAREN')
+        exp = self.expr(None)
+        self.expect('RPAREN')
+        return exp
+
+    def atom(self):
+        """
+        Parses an expression that does not start with another expression
+        """
+        kind = self.peek()
+        value = self.next()
+        if kind == 'VAR':
+            return Var(value)
+        if kind == 'INT':
+            return Int(value)
+        if kind == 'STRING':
+            return String(value[1:-1])
+        if kind in CONSTANTS:
+            if (kind == 'BREAK' or kind == 'CONTINUE') and not self.loops:
+                self.stray = True
+            return CONSTANTS[kind]()
+        if kind == 'MINUS':
+            return Int(-self.expect('INT'))
+        if kind == 'NOT':
+            return Not(self.expr(rule('NOT')))
+        if kind == 'LPAREN':
+            return self.parens()
+        if kind == 'LBRACE':
+            if self.peek() == 'RBRACE':
+                self.next()
+                return List([])
+            items = self.exps()
+            self.expect('RBRACE')
+            return List(items)
+        if kind == 'LCURL':
+            return self.dict()
+        if kind == 'FUN':
+            return self.anonFunction()
+        if kind == 'DEF':
+            return self.function()
+        if kind == 'CLASS':
+            return self.classDef()
+        if kind == 'IF':
+            guard = self.parenthesized()
+            beq = self.block()
+            self.expect('ELSE')
+            return If(guard, beq, self.block())
+        if kind == 'WHILE':
+            guard = self.parenthesized()
+            self.loops += 1
+            loop = self.block()
+            self.loops -= 1
+            return While(guard, loop)
+        if kind == 'FOR':
+            var = self.var()
+            self.expect('IN')
+            iterable = self.expr(None)
+            self.loops += 1
+            loop = self.block()
+            self.loops -= 1
+            return For(var, iterable, loop)
+        if kind == 'PRINT':
+            return Print(self.parenthesized())
+        if kind == 'TEST':
+            return Test(self.parenthesized())
+        raise ParseError(kind)
+
+    def parens(self):
+        """
+        Parses a parenthesized expression or a tuple, after its '('
+        """
+        if self.peek() == 'COMMA':
+            self.next()
+            self.expect('RPAREN')
+            return Tuple(tuple())
+        first = self.expr(None)
+        if self.peek() == 'RPAREN':
+            self.next()
+            return first
+        self.expect('COMMA')
+        if self.peek() == 'RPAREN':
+            self.next()
+            return Tuple((first,))
+        rest = self.exps()
+        self.expect('RPAREN')
+        return Tuple(tuple([first] + rest))
+
+    def dict(self):
+        """
+        Parses a dictionary, after its '{'
+        """
+        keyvals = []
+        if self.peek() != 'RCURL':
+            while True:
+                key = self.expr(None)
+                self.expect('COLON')
+                keyvals.append((key, self.expr(None)))
+                if self.peek() != 'COMMA':
+                    break
+                self.next()
+        self.expect('RCURL')
+        return Dict(keyvals)
+
+    def anonFunction(self):
+        """
+        Parses an anonymous function, after 'fun'
+        """
+        if self.peek() == 'LPAREN':
+            self.next()
+            self.expect('RPAREN')
+            params = []
+        else:
+            params = [self.var()]
+            if self.peek() == 'VAR':
+                params += self.vars()
+        self.expect('ARROW')
+        return AnonFunction(params, self.scope(lambda: self.expr(rule('ARROW'))))
+
+    def function(self):
+        """
+        Parses a function declaration, after 'def'
+        """
+        access = ACCESS.get(self.peek())
+        if access is not None:
+            self.next()
+        pure = access is None and self.peek() == 'PURE'
+        if pure:
+            self.next()
+        name = self.var()
+        self.expect('LPAREN')
+        params = self.vars() if self.peek() != 'RPAREN' else []
+        self.expect('RPAREN')
+        self.expect('COLON')
+        body = self.scope(self.block)
+        if access is None:
+            return Function(name, params, body, pure=pure)
+        if access == PrivacyMod.PROTECTED and not params:
+            # The grammar has no action for this one
+            return None
+        return AccessFunction(name, params, body, access)
+
+    def classDef(self):
+        """
+        Parses a class declaration, after 'class'
+        """
+        name = self.var()
+        superClass = None
+        if self.peek() == 'LPAREN':
+            self.next()
+            superClass = self.var()
+            self.expect('RPAREN')
+        self.expect('COLON')
+        return Class(name, self.scope(self.block), superClass)
+
+
+def parse(prog, line=1, column=1):
+    """
+    Returns the tree of prog, a string holding an OOMPH program
+
+    Like oomphparse.parse, syntax errors are printed and give None, but
+    parsing stops at the first one rather than skipping the token.
+
+    Parameter line, column: the position prog starts at, when it is part of a larger program
+    """
+    # Trees have no cycles, so the cyclic collector would only be walking the nodes made so far
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        return Parser(prog, line, column).program()
+    except ParseError as e:
+        print(e.message)
+        return None
+    finally:
+        if collecting:
+            gc.enable()
+
+
+def sameTree(a, b):
+    """
+    Returns whether two trees are made of the same nodes with the same values
+    """
+    if type(a) != type(b):
+        return False
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(sameTree(x, y) for x, y in zip(a, b))
+    if not isinstance(a, Expr):
+        return a == b
+    return all(sameTree(getattr(a, k), getattr(b, k)) for k in attributes(type(a)))
+
+
+def attributes(cls):
+    """
+    Returns the names of the attributes nodes of the class cls get from parsing
+    """
+    return [name for c in cls.__mro__ for name in c.__dict__.get('__slots__', ()) if name not in CACHES]
+
+
+# Attributes of nodes filled in as they are evaluated, rather than by parsing
+CACHES = {'captures', 'cache', 'layout'}
@@ -0,0 +1,160 @@
+"""
+A profiler for OOMPH programs run by the tree engine
+
+A Profiler is an oomphtrace hook timing each node and function body it
+hears about, so it can report how often each OOMPH function ran and how
+long it took, with and without the functions it called, and the same for
+each kind of node. It also keeps the time spent in every distinct stack
+of OOMPH functions, which writeStacks saves in the collapsed format read
+by flame graph tools such as flamegraph.pl and speedscope.
+
+A call in tail position runs after the function making it has returned,
+so it shows up as called by that function's caller.
+"""
+import time
+from ast import *
+import oomphtrace
+
+
+# The label of the time spent outside any function
+MAIN = '<main>'
+
+
+def labels(tree):
+    """
+    Returns {id(function): label} naming each function in tree
+
+    Named functions are labeled by their name, methods by their class and
+    name, and anonymous functions by their parameters and where they are.
+    """
+    found = {}
+    todo = [(tree, None)]
+    while todo:
+        e, cls = todo.pop()
+        if isinstance(e, Class):
+            cls = e.name.name
+        elif isinstance(e, Function):
+            found[id(e)] = f"{cls}.{e.name.name}" if cls is not None else e.name.name
+            cls = None
+        elif isinstance(e, AnonFunction):
+            params = ''.join(' ' + a.name for a in e.args)
+            place = f" at {e.line}:{e.column}" if e.line is not None else ""
+            found[id(e)] = f"<fun{params}{place}>"
+            cls = None
+        todo.extend((child, cls) for child in e.children())
+    return found
+
+
+class Stats:
+    """
+    The number of times something ran, and the time it took with (inclusive) and without (exclusive) what it ran
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        # How many runs of it are underway, so time in recursive runs is only counted once
+        self.active = 0
+
+    def record(self, elapsed, exclusive):
+        """
+        Counts a run that took elapsed seconds, exclusive of them outside of it
+        """
+        self.calls += 1
+        self.exclusive += exclusive
+        if self.active == 0:
+            self.inclusive += elapsed
+
+
+class Profiler:
+    def __init__(self, tree):
+        self.tree = tree
+        self.labels = labels(tree)
+        self.functions = {}
+        self.nodes = {}
+        # {(label, ...): exclusive seconds} for each stack of functions
+        self.stacks = {}
+        # Frames of the nodes being evaluated, each [stats, start, seconds in nodes it evaluated]
+        self.nodeFrames = []
+        # Frames of the functions being run, each [label, start, seconds in functions it called]
+        self.functionFrames = []
+
+    def hook(self, event, node, arg):
+        if event == 'enter':
+            stats = self.stats(self.nodes, type(node).__name__)
+            stats.active += 1
+            self.nodeFrames.append([stats, time.perf_counter(), 0.0])
+        elif event == 'exit' or event == 'raise':
+            stats, start, inner = self.nodeFrames.pop()
+            elapsed = time.perf_counter() - start
+            if self.nodeFrames:
+                self.nodeFrames[-1][2] += elapsed
+            stats.active -= 1
+            stats.record(elapsed, elapsed - inner)
+        elif event == 'call':
+            self.enter(self.labels[id(node)])
+        elif event == 'return':
+            self.exit()
+
+    def stats(self, table, key):
+        stats = table.get(key)
+        if stats is None:
+            stats = table[key] = Stats()
+        return stats
+
+    def enter(self, label):
+        self.stats(self.functions, label).active += 1
+        self.functionFrames.append([label, time.perf_counter(), 0.0])
+
+    def exit(self):
+        stack = tuple(label for label, _, _ in self.functionFrames)
+        label, start, inner = self.functionFrames.pop()
+        elapsed = time.perf_counter() - start
+        if self.functionFrames:
+            self.functionFrames[-1][2] += elapsed
+        stats = self.functions[label]
+        stats.active -= 1
+        stats.record(elapsed, elapsed - inner)
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed - inner
+
+    def run(self, run, env):
+        """
+        Returns the result of run(env) while profiling
+
+        Parameter run: a function evaluating the program the profiler was made for
+        """
+        self.enter(MAIN)
+        oomphtrace.settrace(self.hook, self.tree)
+        try:
+            return run(env)
+        finally:
+            oomphtrace.settrace(None)
+            self.exit()
+
+    def table(self):
+        """
+        Returns the profile as text, with a table of functions and one of node types, hottest first
+        """
+        lines = []
+        for title, table in (('function', self.functions), ('node', self.nodes)):
+            width = max([len(title)] + [len(key) for key in table])
+            lines.append(f"{title:<{width}} {'calls':>10} {'inclusive ms':>14} {'exclusive ms':>14} {'per call us':>12}")
+            for key, stats in sorted(table.items(), key=lambda item: item[1].exclusive, reverse=True):
+                lines.append(f"{key:<{width}} {stats.calls:>10} {stats.inclusive * 1000:>14.3f} "
+                             f"{stats.exclusive * 1000:>14.3f} {stats.exclusive / stats.calls * 1e6:>12.2f}")
+            lines.append('')
+        return '\n'.join(lines)
+
+    def writeStacks(self, filename):
+        """
+        Writes the time spent in each stack of functions to filename in the collapsed stack format
+
+        Each line is the functions of a stack from the outermost, separated by
+        semicolons, then the microseconds spent in the innermost one.
+        """
+        with open(filename, 'w') as file:
+            for stack, seconds in sorted(self.stacks.items()):
+                # Semicolons and spaces would be read as separators
+                names = [label.replace(';', ',').replace(' ', '_') for label in stack]
+                file.write(f"{';'.join(names)} {round(seconds * 1e6)}\n")
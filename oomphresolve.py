@@ -0,0 +1,78 @@
+"""
+A resolver pass giving every variable of an OOMPH program a slot in a frame
+
+Functions copy their defining environment when they are made, so a closure
+never looks variables up in an enclosing frame once it has been created.
+Every variable a function body uses, including those it captures, is
+therefore given a slot in the body's own frame: all addresses are at frame
+depth 0, and making a closure copies the captured slots out of the
+enclosing frame.
+"""
+from ast import *
+
+
+# The value of a slot whose variable has not been bound
+UNBOUND = object()
+
+
+class Scope:
+    """
+    The variables of a program, a function body, or the members of a class body
+
+    names maps each variable name to its slot, in order of first use
+    """
+    def __init__(self, names):
+        # Method calls read the caller's super, so every scope has it first
+        assert names[0] == 'super'
+        self.names = {name: slot for slot, name in enumerate(names)}
+
+    def frame(self, env):
+        """
+        Returns a new frame for this scope, holding the values of the names bound in env
+
+        Parameter env: a dictionary mapping variable names to values
+        """
+        return [env.get(name, UNBOUND) for name in self.names]
+
+    def bindings(self, frame):
+        """
+        Returns a dictionary mapping the bound names of frame to their values
+        """
+        return {name: frame[slot] for name, slot in self.names.items() if frame[slot] is not UNBOUND}
+
+    def __str__(self):
+        return f"<{', '.join(f'{slot}: {name}' for name, slot in self.names.items())}>"
+
+
+class Resolution:
+    """
+    The scopes of a program
+
+    root is the scope of the top level, and scopes maps the id of every
+    Function and AnonFunction to the scope of its body and the id of every
+    Class to the scope its members are evaluated in
+    """
+    def __init__(self, tree, names=()):
+        self.root = Scope(scopeNames(tree, names))
+        self.scopes = {}
+
+    def scope(self, node):
+        return self.scopes[id(node)]
+
+
+def resolve(tree, names=()):
+    """
+    Returns the Resolution of tree, a program as returned by oomphparse.parse
+
+    Parameter names: the names already bound where tree is run, which a constructor it calls may use
+    """
+    resolution = Resolution(tree, names)
+    todo = [tree]
+    while todo:
+        e = todo.pop()
+        if isinstance(e, (Function, AnonFunction)):
+            resolution.scopes[id(e)] = Scope(e.capturedNames())
+        elif isinstance(e, Class):
+            resolution.scopes[id(e)] = Scope(scopeNames(e.body))
+        todo.extend(e.children())
+    return resolution
@@ -0,0 +1,163 @@
+"""
+Ropes: long strings built by concatenation, kept as the list of their pieces
+
+Adding two Python strings copies both, so a loop building a string with
+s := s + ... takes time quadratic in its length. Once adding two strings
+gives one at least ROPE_LENGTH long, add gives a Rope instead, and
+adding to a Rope appends to its list of pieces without copying the text.
+A Rope is still an immutable string for a program: the ropes made by
+appending to the same one share its list, each using the first count
+pieces of it, and only the rope using all of them appends to the list in
+place, so appending to an older rope copies the list first.
+
+Printing a rope, comparing it or hashing it joins its pieces once, and
+keeps the result. Indexing and slicing find the pieces holding the
+characters they need and only join those.
+"""
+import bisect
+import itertools
+
+
+# Strings at least this long are built as ropes, shorter ones are cheaper to copy
+ROPE_LENGTH = 8192
+
+
+def add(left, right):
+    """
+    Returns left + right, as Plus evaluates it
+    """
+    if type(left) == str:
+        return concat(left, right)
+    return left + right
+
+
+def concat(left, right):
+    """
+    Returns left + right, which is a Rope if both are strings and the result is long
+
+    Parameter left: a string
+    """
+    if type(right) == str and len(left) + len(right) >= ROPE_LENGTH:
+        return Rope([left, right], [len(left), len(left) + len(right)], 2)
+    return left + right
+
+
+def text(value):
+    """
+    Returns value as a string if it is a Rope, or value itself otherwise
+    """
+    return str(value) if type(value) == Rope else value
+
+
+class Rope:
+    __slots__ = ('parts', 'ends', 'count', 'flat')
+
+    def __init__(self, parts, ends, count):
+        # Lists shared with the ropes appended to this one, of which this one uses the first count items
+        self.parts = parts
+        # Where each piece ends in the string
+        self.ends = ends
+        self.count = count
+        # The joined string, once it has been needed
+        self.flat = None
+
+    def append(self, piece):
+        """
+        Returns the Rope of this string followed by the string piece
+        """
+        if not piece:
+            return self
+        parts, ends, count = self.parts, self.ends, self.count
+        if len(parts) != count:
+            # Another rope was appended to this one first
+            parts, ends = parts[:count], ends[:count]
+        parts.append(piece)
+        ends.append(ends[-1] + len(piece))
+        return Rope(parts, ends, count + 1)
+
+    def __add__(self, other):
+        if type(other) == str:
+            return self.append(other)
+        if type(other) == Rope:
+            return self.append(str(other))
+        return NotImplemented
+
+    def __radd__(self, other):
+        if type(other) != str:
+            return NotImplemented
+        if not other:
+            return self
+        parts = [other] + self.parts[:self.count]
+        return Rope(parts, list(itertools.accumulate(map(len, parts))), len(parts))
+
+    def __mul__(self, times):
+        return str(self) * times
+
+    __rmul__ = __mul__
+
+    def __str__(self):
+        if self.flat is None:
+            self.flat = ''.join(self.parts[:self.count])
+            # This rope now has a list of its own, which later appends can add to
+            self.parts, self.ends, self.count = [self.flat], [len(self.flat)], 1
+        return self.flat
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __len__(self):
+        return self.ends[self.count - 1]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.parts[:self.count])
+
+    def __getitem__(self, index):
+        if self.flat is not None:
+            return self.flat[index]
+        if type(index) != slice:
+            position = index + len(self) if index < 0 else index
+            if not 0 <= position < len(self):
+                raise IndexError("string index out of range")
+            i = bisect.bisect_right(self.ends, position, 0, self.count)
+            return self.parts[i][position - self.ends[i] + len(self.parts[i])]
+        start, stop, step = index.indices(len(self))
+        if step != 1:
+            return ''.join(map(self.__getitem__, range(start, stop, step)))
+        if start >= stop:
+            return ''
+        first = bisect.bisect_right(self.ends, start, 0, self.count)
+        last = bisect.bisect_left(self.ends, stop, 0, self.count)
+        # Where the first piece starts in the string
+        offset = self.ends[first] - len(self.parts[first])
+        if first == last:
+            return self.parts[first][start - offset:stop - offset]
+        pieces = self.parts[first:last + 1]
+        pieces[0] = pieces[0][start - offset:]
+        pieces[-1] = pieces[-1][:len(pieces[-1]) - (self.ends[last] - stop)]
+        return ''.join(pieces)
+
+    def __eq__(self, other):
+        if type(other) not in (str, Rope):
+            return NotImplemented
+        return len(self) == len(other) and str(self) == str(other)
+
+    def __ne__(self, other):
+        if type(other) not in (str, Rope):
+            return NotImplemented
+        return not self == other
+
+    def __lt__(self, other):
+        return str(self) < text(other) if type(other) in (str, Rope) else NotImplemented
+
+    def __le__(self, other):
+        return str(self) <= text(other) if type(other) in (str, Rope) else NotImplemented
+
+    def __gt__(self, other):
+        return str(self) > text(other) if type(other) in (str, Rope) else NotImplemented
+
+    def __ge__(self, other):
+        return str(self) >= text(other) if type(other) in (str, Rope) else NotImplemented
+
+    def __hash__(self):
+        # Equal to the string it stands for, so either one finds the other as a dictionary key
+        return hash(str(self))
@@ -0,0 +1,112 @@
+"""
+Runs an OOMPH program one top-level statement at a time, as it is read
+
+A program is a sequence of statements separated by semicolons, and
+running them one after another in the same environment is the same as
+running their sequence. statements reads a file in chunks and gives back
+each top-level statement as soon as the semicolon ending it has been
+read, so only one statement is ever held in memory, and the output of
+the first statements of a long program shows up before the rest of it
+has been read.
+"""
+import re
+
+
+# Characters that can change whether a semicolon ends a top-level statement
+SPECIAL = re.compile(r'''[;(){}\[\]'"]''')
+OPENERS = {'(', '{', '['}
+CLOSERS = {')', '}', ']'}
+
+CHUNK_SIZE = 1 << 16
+
+
+def statements(file, chunkSize=CHUNK_SIZE):
+    """
+    Yields (text, line, column) for each top-level statement of the program read from file,
+    with the line and column of its first character that is not blank, both counted from 1
+
+    Semicolons inside brackets or strings are part of the statement they are in.
+    The last statement is yielded even if it is empty, so that a program ending
+    with a semicolon is a syntax error, as it is when the whole program is parsed.
+
+    Parameter file: a text file to read the program from
+    """
+    # The text of the statement being read from the chunks before this one, joined once the statement ends
+    pending = []
+    # How deep in brackets the scan is, and the quote of the string it is in, or None
+    depth, quote = 0, None
+    line, column = 1, 1
+    while True:
+        chunk = file.read(chunkSize)
+        if not chunk:
+            break
+        # Where the statement being read starts in chunk, and how far chunk has been scanned
+        start, pos = 0, 0
+        while True:
+            if quote is not None:
+                end = chunk.find(quote, pos)
+                if end < 0:
+                    break
+                pos, quote = end + 1, None
+                continue
+            m = SPECIAL.search(chunk, pos)
+            if m is None:
+                break
+            c = m.group()
+            pos = m.end()
+            if c in OPENERS:
+                depth += 1
+            elif c in CLOSERS:
+                depth -= 1
+            elif c == "'" or c == '"':
+                quote = c
+            elif c == ';' and depth == 0:
+                pending.append(chunk[start:pos - 1])
+                text = ''.join(pending)
+                pending = []
+                yield statement(text, line, column)
+                line, column = advance(text, line, column)
+                # Past the semicolon
+                column += 1
+                start = pos
+        pending.append(chunk[start:])
+    yield statement(''.join(pending), line, column)
+
+
+def statement(text, line, column):
+    """
+    Returns (text, line, column) for a statement starting at line and column, without the blanks before it
+    """
+    stripped = text.lstrip()
+    return (stripped, *advance(text[:len(text) - len(stripped)], line, column))
+
+
+def advance(text, line, column):
+    """
+    Returns the position just after text, which starts at line and column
+    """
+    newlines = text.count('\n')
+    if newlines == 0:
+        return line, column + len(text)
+    return line + newlines, len(text) - text.rfind('\n')
+
+
+def run(file, parse, run, env, optimize=None):
+    """
+    Runs the program read from file one statement at a time in env, returning the configuration of the last one
+
+    A statement with a syntax error stops the program, after the ones before it have run.
+
+    Parameter parse: a function returning the tree of a statement, taking the statement and where it starts
+    Parameter run: an engine, a function running a tree in an environment
+    Parameter optimize: a function optimizing each tree before it is run, or None
+    """
+    result = None, env
+    for text, line, column in statements(file):
+        tree = parse(text, line, column)
+        if tree is None:
+            raise SyntaxError(f"Syntax error in the statement at line {line}, column {column}")
+        if optimize is not None:
+            tree = optimize(tree)
+        result = run(tree, result[1])
+    return result
@@ -0,0 +1,117 @@
+"""
+Hooks into the evaluation of OOMPH programs by the tree engine, like sys.settrace does for Python
+
+settrace(hook, tree) has hook(event, node, arg) called as tree runs:
+
+    'enter'   before node is evaluated, with the environment it is evaluated in
+    'exit'    after node is evaluated, with its value (which is a TailCall when
+              node makes a call in tail position and the call is still to run)
+    'raise'   when evaluating node raised, with the exception
+    'call'    before the body of a function runs, where node is the Function or
+              AnonFunction the body belongs to and arg the environment of the body
+    'return'  after the body of a function ran, with its value, or None if it raised
+
+The hook is installed by wrapping the eval and tail methods of every kind
+of node, and settrace(None) puts the originals back, so a program run with
+no hook installed runs exactly the same code as one that was never traced.
+Nodes have a line and column, so a hook can tell where in the program it
+is. The other engines do not evaluate nodes one at a time and are not traced.
+Calls of a function whose body is only true, false, null or skip are not
+reported, as there is one such node for the whole program.
+"""
+from ast import *
+
+
+_hook = None
+# The (class, name, method) of every method replaced to call the hook
+_originals = []
+
+
+def functions(tree):
+    """
+    Returns {id(body): function} for every Function and AnonFunction in tree
+
+    Functions whose body is a Singleton are left out, since that node is shared with the rest of the program.
+    """
+    found = {}
+    todo = [tree]
+    while todo:
+        e = todo.pop()
+        if isinstance(e, (Function, AnonFunction)) and not isinstance(e.exp, Singleton):
+            found[id(e.exp)] = e
+        todo.extend(e.children())
+    return found
+
+
+def nodeTypes():
+    """
+    Returns every subclass of Expr
+    """
+    found, todo = [], [Expr]
+    while todo:
+        cls = todo.pop()
+        found.append(cls)
+        todo.extend(cls.__subclasses__())
+    return found
+
+
+def gettrace():
+    """
+    Returns the hook installed by settrace, or None
+    """
+    return _hook
+
+
+def settrace(hook, tree=None):
+    """
+    Calls hook(event, node, arg) for each event of the evaluation of tree until settrace(None)
+
+    Parameter hook: the function to call, or None to stop tracing
+    Parameter tree: the program about to be run, needed to tell function bodies from other nodes
+    """
+    global _hook
+    for cls, name, original in reversed(_originals):
+        setattr(cls, name, original)
+    _originals.clear()
+    _hook = hook
+    if hook is None:
+        return
+    bodies = functions(tree) if tree is not None else {}
+    # The nodes being evaluated, innermost last
+    evaluating = []
+    for cls in nodeTypes():
+        for name in ('eval', 'tail'):
+            if name in cls.__dict__:
+                original = cls.__dict__[name]
+                _originals.append((cls, name, original))
+                setattr(cls, name, traced(original, name == 'tail', hook, bodies, evaluating))
+
+
+def traced(original, isTail, hook, bodies, evaluating):
+    """
+    Returns a version of the eval or tail method original that calls hook
+    """
+    def method(node, env):
+        # Like the default tail calling eval, or eval calling the eval of a superclass
+        if evaluating and evaluating[-1] is node:
+            return original(node, env)
+        function = bodies.get(id(node))
+        if function is not None:
+            hook('call', function, env)
+        hook('enter', node, env)
+        evaluating.append(node)
+        try:
+            result = original(node, env)
+        except BaseException as e:
+            evaluating.pop()
+            hook('raise', node, e)
+            if function is not None:
+                hook('return', function, None)
+            raise
+        evaluating.pop()
+        value = result if isTail else result[0]
+        hook('exit', node, value)
+        if function is not None:
+            hook('return', function, value)
+        return result
+    return method
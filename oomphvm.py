@@ -0,0 +1,726 @@
+"""
+A bytecode compiler and stack machine for OOMPH
+
+compileProgram flattens a tree into a Code object: parallel lists of
+opcodes and operands, with jumps for If, While, For, And and Or instead of
+nested nodes. execute runs a Code object with a single dispatch loop;
+calls push a frame on the machine's own frame stack rather than
+recursing in Python. disassemble renders a Code object and the bodies of
+the functions in it as text.
+"""
+from ast import *
+import operator
+
+
+# Instruction set. Operands are stored directly: constants, names, nodes and jump targets
+LOAD_CONST = 0       # push the operand
+LOAD_NAME = 1        # push the value of the variable named by the operand
+STORE_NAME = 2       # pop a value and bind it to the variable named by the operand
+STORE_ATTR = 3       # pop a value and an object, and set the attribute named by the operand
+STORE_INDEX = 4      # pop a value, an index and a collection, and set the item
+STORE_SLICE = 5      # pop a value, a collection and the bounds flagged by the operand, and set the slice
+POP = 6              # pop and discard a value
+WRAP_ACCESS = 7      # replace the top value v with (v, operand), for access modified bindings
+BUILD_LIST = 8       # pop operand values and push them as a list
+BUILD_TUPLE = 9      # pop operand values and push them as a tuple
+BUILD_DICT = 10      # pop operand key, value pairs and push them as a dictionary
+INDEX = 11           # pop an index and a collection and push the item
+SLICE = 12           # pop the bounds flagged by the operand and a collection, and push the slice
+DOT = 13             # replace the top value with its attribute, looked up by the Dot node operand
+BINARY_OP = 14       # pop two values and push the operator operand applied to them
+BINARY_CONST = 15    # replace the top value v with f(v, c), for the (f, c) operand
+NOT = 16             # replace the top value with its negation
+JUMP = 17            # continue at the operand
+JUMP_IF_FALSE = 18   # pop a value and continue at the operand if it is false
+JUMP_IF_FALSE_OR_POP = 19  # continue at the operand keeping the top value if it is false, else pop it
+JUMP_IF_TRUE_OR_POP = 20   # continue at the operand keeping the top value if it is true, else pop it
+MAKE_FUNCTION = 21   # push a closure for the (function node, body code) operand
+MAKE_CLASS = 22      # bind and push a class for the (class node, member codes) operand
+LOAD_METHOD = 23     # replace an object with its attribute looked up by the Dot node operand, and the receiver of that
+PREPARE_CALL = 24    # check the top value can be called by the App node operand, and push its receiver
+PREPARE_METHOD = 25  # check the function and receiver on top can be called by the App node operand
+CALL = 26            # pop operand arguments, a receiver and the function below them, and call it
+RETURN = 27          # pop the return value and return to the calling frame
+PRINT = 28           # print the top value
+TEST = 29            # pop a value and fail the Test node operand if it is false
+INPUT = 30           # read an int and push it
+COPY_CONST = 31      # push a copy of the list or dictionary operand
+STORE_MEMO = 32      # store the top value in the memo under the key of the (memo, key) pair below it, and drop the pair
+GET_ITER = 33        # replace the top value with an iterator over it
+FOR_ITER = 34        # push the next value of the iterator on top, or continue at the operand if it has none
+
+OPNAMES = {v: k for k, v in list(globals().items()) if k.isupper() and type(v) == int}
+
+BINARY = {
+    Plus: add,
+    Minus: operator.sub,
+    Times: operator.mul,
+    Equals: operator.eq,
+    NotEquals: operator.ne,
+    Less: operator.lt,
+    LessEq: operator.le,
+    Greater: operator.gt,
+    GreaterEq: operator.ge,
+}
+
+# Bounds present in a slice, as the operand of SLICE and STORE_SLICE
+START = 1
+END = 2
+
+
+class Code(Expr):
+    """
+    A compiled program or function body
+
+    Closures made by the machine use this as their body, so they can still be
+    called by the tree walking evaluator and by Object constructors
+    """
+    __slots__ = ('name', 'source', 'ops', 'args', 'nodes')
+
+    def __init__(self, name, source):
+        self.name = name
+        self.source = source
+        self.ops = []
+        self.args = []
+        # {position of an instruction: the node it came from}, for instructions whose errors say where they are
+        self.nodes = {}
+
+    def eval(self, env):
+        return execute(self, env), env
+
+    def __str__(self):
+        return str(self.source)
+
+
+def memoizer():
+    """
+    Returns the code of the frame a call to a pure function returns to, which caches its result
+    """
+    code = Code('<memoize>', Skip())
+    code.ops, code.args = [STORE_MEMO, RETURN], [None, None]
+    return code
+
+
+MEMOIZE = memoizer()
+
+
+class Label:
+    def __init__(self):
+        self.pos = None
+
+
+class Assembler:
+    """
+    Builds a Code object, keeping track of the depth of the value stack and the enclosing loops
+    """
+    def __init__(self, name, source):
+        self.code = Code(name, source)
+        self.depth = 0
+        # (continue label, break label, stack depth) of each loop we are in
+        self.loops = []
+
+    def emit(self, op, arg=None, effect=0, node=None):
+        """
+        Adds an instruction changing the stack depth by effect
+
+        Parameter node: the node the instruction came from, if its errors should say where it is
+        """
+        if node is not None:
+            self.code.nodes[len(self.code.ops)] = node
+        self.code.ops.append(op)
+        self.code.args.append(arg)
+        self.depth += effect
+
+    def place(self, label):
+        label.pos = len(self.code.ops)
+
+    def finish(self):
+        self.emit(RETURN, effect=-1)
+        args = self.code.args
+        for i, arg in enumerate(args):
+            if isinstance(arg, Label):
+                args[i] = arg.pos
+        return self.code
+
+
+def compileProgram(tree):
+    """
+    Returns the Code object for tree, a program as returned by oomphparse.parse
+    """
+    asm = Assembler('<program>', tree)
+    emit(tree, asm)
+    return asm.finish()
+
+
+def compileBody(name, expr):
+    asm = Assembler(name, expr)
+    emit(expr, asm)
+    return asm.finish()
+
+
+def emit(expr, asm):
+    """
+    Adds the instructions pushing the value of expr to asm
+    """
+    EMITTERS.get(type(expr), emitTree)(expr, asm)
+
+
+def emitTree(node, asm):
+    raise TypeError(f"Can not compile {type(node).__name__} to bytecode")
+
+
+def emitConst(value):
+    return lambda node, asm: asm.emit(LOAD_CONST, value, 1)
+
+
+def emitValue(node, asm):
+    asm.emit(LOAD_CONST, node.value, 1)
+
+
+def emitAll(exprs, asm):
+    for e in exprs:
+        emit(e, asm)
+
+
+def emitList(node, asm):
+    emitAll(node.value, asm)
+    asm.emit(BUILD_LIST, len(node.value), 1 - len(node.value))
+
+
+def emitTuple(node, asm):
+    emitAll(node.value, asm)
+    asm.emit(BUILD_TUPLE, len(node.value), 1 - len(node.value))
+
+
+def emitDict(node, asm):
+    emitAll([e for kv in node.keyvals for e in kv], asm)
+    asm.emit(BUILD_DICT, len(node.keyvals), 1 - 2 * len(node.keyvals))
+
+
+def emitVar(node, asm):
+    asm.emit(LOAD_NAME, node.name, 1, node)
+
+
+def emitIndex(node, asm):
+    emitAll([node.obj, node.ind], asm)
+    asm.emit(INDEX, None, -1)
+
+
+def emitBounds(node, asm):
+    """
+    Adds the instructions pushing the bounds present in a slice, returning their flags
+    """
+    flags = 0
+    if node.start is not None:
+        emit(node.start, asm)
+        flags |= START
+    if node.end is not None:
+        emit(node.end, asm)
+        flags |= END
+    return flags
+
+
+def boundCount(flags):
+    return bool(flags & START) + bool(flags & END)
+
+
+def emitSlice(node, asm):
+    emit(node.obj, asm)
+    flags = emitBounds(node, asm)
+    asm.emit(SLICE, flags, -boundCount(flags))
+
+
+def emitClass(node, asm):
+    members = [(isinstance(m, Function), compileBody(f"<member {node.name}>", m)) for m in statements(node.body)]
+    asm.emit(MAKE_CLASS, (node, members), 1)
+
+
+def emitDot(node, asm):
+    emit(node.obj, asm)
+    asm.emit(DOT, node)
+
+
+def emitFunction(node, asm):
+    name = node.name.name if isinstance(node, Function) else '<fun>'
+    asm.emit(MAKE_FUNCTION, (node, compileBody(name, node.exp)), 1)
+
+
+def emitApp(node, asm):
+    if type(node.func) == Dot:
+        # Call methods directly rather than through a MethodClosure
+        emit(node.func.obj, asm)
+        asm.emit(LOAD_METHOD, node.func, 1)
+        asm.emit(PREPARE_METHOD, node)
+    else:
+        emit(node.func, asm)
+        asm.emit(PREPARE_CALL, node, 1)
+    emitAll(node.args, asm)
+    asm.emit(CALL, len(node.args), -len(node.args) - 1)
+
+
+def emitBinary(node, asm):
+    emit(node.left, asm)
+    if type(node.right) in (Int, String, Const):
+        # The most common case, like x + 1, takes one instruction instead of two
+        asm.emit(BINARY_CONST, (BINARY[type(node)], node.right.value))
+    else:
+        emit(node.right, asm)
+        asm.emit(BINARY_OP, BINARY[type(node)], -1)
+
+
+def emitShortCircuit(node, asm):
+    end = Label()
+    emit(node.left, asm)
+    asm.emit(JUMP_IF_FALSE_OR_POP if isinstance(node, And) else JUMP_IF_TRUE_OR_POP, end, -1)
+    emit(node.right, asm)
+    asm.place(end)
+
+
+def emitNot(node, asm):
+    emit(node.bexp, asm)
+    asm.emit(NOT)
+
+
+def emitAssign(node, asm):
+    emitStore(node, asm)
+    asm.emit(LOAD_CONST, (), 1)
+
+
+def emitStore(node, asm):
+    """
+    Adds the instructions of an assignment, without pushing its value
+    """
+    var = node.var
+    access = isinstance(node, AccessAssign) and isinstance(var, (Var, Dot))
+    if isinstance(var, Var):
+        emit(node.exp, asm)
+        if access:
+            asm.emit(WRAP_ACCESS, node.access)
+        asm.emit(STORE_NAME, var.name, -1)
+    elif isinstance(var, Dot):
+        emitAll([var.obj, node.exp], asm)
+        if access:
+            asm.emit(WRAP_ACCESS, node.access)
+        asm.emit(STORE_ATTR, var.attr.name, -2)
+    elif isinstance(var, Index):
+        emitAll([var.obj, var.ind, node.exp], asm)
+        asm.emit(STORE_INDEX, None, -3)
+    else:
+        flags = emitBounds(var, asm)
+        emitAll([var.obj, node.exp], asm)
+        asm.emit(STORE_SLICE, flags, -2 - boundCount(flags))
+
+
+def emitBlock(node, asm):
+    *init, last = statements(node)
+    for c in init:
+        emitStatement(c, asm)
+    emit(last, asm)
+
+
+def emitStatement(expr, asm):
+    """
+    Adds the instructions running expr for its effects only, leaving nothing on the stack
+    """
+    if type(expr) in (Assign, AccessAssign):
+        emitStore(expr, asm)
+    elif type(expr) == Test:
+        emitCheck(expr, asm)
+    elif type(expr) == Block:
+        for c in statements(expr):
+            emitStatement(c, asm)
+    else:
+        emit(expr, asm)
+        asm.emit(POP, None, -1)
+
+
+def emitIf(node, asm):
+    orelse, end = Label(), Label()
+    emit(node.guard, asm)
+    asm.emit(JUMP_IF_FALSE, orelse, -1)
+    emit(node.beq, asm)
+    asm.emit(JUMP, end, -1)
+    asm.place(orelse)
+    emit(node.bneq, asm)
+    asm.place(end)
+
+
+def emitWhile(node, asm):
+    start, end = Label(), Label()
+    asm.place(start)
+    emit(node.guard, asm)
+    asm.emit(JUMP_IF_FALSE, end, -1)
+    asm.loops.append((start, end, asm.depth))
+    emitStatement(node.loop, asm)
+    asm.loops.pop()
+    asm.emit(JUMP, start)
+    asm.place(end)
+    asm.emit(LOAD_CONST, (), 1)
+
+
+def emitFor(node, asm):
+    start, end = Label(), Label()
+    emit(node.iterable, asm)
+    asm.emit(GET_ITER)
+    asm.place(start)
+    asm.emit(FOR_ITER, end, 1)
+    asm.emit(STORE_NAME, node.var.name, -1)
+    # The iterator stays on the stack until the loop ends, however it ends
+    asm.loops.append((start, end, asm.depth))
+    emitStatement(node.loop, asm)
+    asm.loops.pop()
+    asm.emit(JUMP, start)
+    asm.place(end)
+    asm.emit(POP, None, -1)
+    asm.emit(LOAD_CONST, (), 1)
+
+
+def emitLoopControl(node, asm):
+    start, end, depth = asm.loops[-1]
+    # Drop whatever the loop body had pushed so far
+    for _ in range(asm.depth - depth):
+        asm.emit(POP)
+    asm.emit(JUMP, end if isinstance(node, Break) else start)
+    # Nothing after this runs, but the enclosing expression expects a value
+    asm.depth += 1
+
+
+def emitPrint(node, asm):
+    emit(node.exp, asm)
+    asm.emit(PRINT)
+
+
+def emitTest(node, asm):
+    emitCheck(node, asm)
+    asm.emit(LOAD_CONST, (), 1)
+
+
+def emitCheck(node, asm):
+    emit(node.exp, asm)
+    asm.emit(TEST, node, -1)
+
+
+EMITTERS = {
+    Int: emitValue,
+    String: emitValue,
+    Const: emitValue,
+    ConstCopy: lambda node, asm: asm.emit(COPY_CONST, node.value, 1),
+    BTrue: emitConst(True),
+    BFalse: emitConst(False),
+    Null: emitConst(None),
+    Skip: emitConst(()),
+    List: emitList,
+    Tuple: emitTuple,
+    Dict: emitDict,
+    Var: emitVar,
+    Index: emitIndex,
+    Slice: emitSlice,
+    Class: emitClass,
+    Dot: emitDot,
+    Function: emitFunction,
+    AccessFunction: emitFunction,
+    AnonFunction: emitFunction,
+    App: emitApp,
+    Not: emitNot,
+    And: emitShortCircuit,
+    Or: emitShortCircuit,
+    Input: lambda node, asm: asm.emit(INPUT, None, 1),
+    Assign: emitAssign,
+    AccessAssign: emitAssign,
+    Block: emitBlock,
+    If: emitIf,
+    While: emitWhile,
+    For: emitFor,
+    Break: emitLoopControl,
+    Continue: emitLoopControl,
+    Print: emitPrint,
+    Test: emitTest,
+}
+EMITTERS.update({op: emitBinary for op in BINARY})
+
+
+def disassemble(code):
+    """
+    Returns the instructions of code, and of the function bodies and class members in it, as text
+    """
+    lines, todo = [], [code]
+    while todo:
+        code = todo.pop(0)
+        lines.append(f"Disassembly of {code.name}:")
+        for pc, (op, arg) in enumerate(zip(code.ops, code.args)):
+            if op == MAKE_FUNCTION:
+                todo.append(arg[1])
+                text = arg[1].name
+            elif op == MAKE_CLASS:
+                todo.extend(member for _, member in arg[1])
+                text = arg[0].name.name
+            elif op in (DOT, LOAD_METHOD):
+                text = arg.attr.name
+            elif op in (PREPARE_CALL, PREPARE_METHOD):
+                text = str(len(arg.args))
+            elif op == BINARY_OP:
+                text = arg.__name__
+            elif op == BINARY_CONST:
+                text = f"{arg[0].__name__} {arg[1]!r}"
+            elif op == TEST:
+                text = str(arg.exp)
+            else:
+                text = '' if arg is None else repr(arg)
+            lines.append(f"{pc:>6} {OPNAMES[op]:<22}{text}")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def run(tree, env):
+    """
+    Compiles tree to bytecode and executes it in env
+
+    Returns the same (value, variableBindings) configuration as tree.eval(env)
+    """
+    return execute(compileProgram(tree), env), env
+
+
+def execute(code, env):
+    """
+    Runs code in env on the machine and returns its value
+    """
+    # Frames of the callers, each (code, pc, env, stack, constructed object)
+    frames = []
+    ops, args, pc, stack, constructing = code.ops, code.args, 0, [], None
+    push, pop = stack.append, stack.pop
+    while True:
+        op = ops[pc]
+        arg = args[pc]
+        pc += 1
+        if op == LOAD_NAME:
+            try:
+                push(env[arg])
+            except KeyError:
+                builtin = BUILTINS.get(arg)
+                if builtin is None:
+                    raise UnboundVariable(arg, code.nodes.get(pc - 1))
+                push(builtin)
+        elif op == LOAD_CONST:
+            push(arg)
+        elif op == STORE_NAME:
+            env[arg] = pop()
+        elif op == BINARY_OP:
+            right = pop()
+            stack[-1] = arg(stack[-1], right)
+        elif op == BINARY_CONST:
+            stack[-1] = arg[0](stack[-1], arg[1])
+        elif op == POP:
+            pop()
+        elif op == JUMP_IF_FALSE:
+            if not pop():
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == FOR_ITER:
+            try:
+                push(next(stack[-1]))
+            except StopIteration:
+                pc = arg
+        elif op == NOT:
+            stack[-1] = not stack[-1]
+        elif op == JUMP_IF_FALSE_OR_POP:
+            if stack[-1]:
+                pop()
+            else:
+                pc = arg
+        elif op == JUMP_IF_TRUE_OR_POP:
+            if stack[-1]:
+                pc = arg
+            else:
+                pop()
+        elif op == DOT:
+            stack[-1] = arg.lookup(stack[-1])
+        elif op == LOAD_METHOD:
+            stack[-1:] = arg.resolve(stack[-1])
+        elif op == PREPARE_METHOD:
+            prepareMethod(arg, stack)
+        elif op == PREPARE_CALL:
+            prepareCall(arg, stack)
+        elif op == CALL:
+            vals = popAll(stack, arg)
+            receiver = pop()
+            callee = pop()
+            if receiver is not None:
+                vals.insert(0, receiver.eval(env)[0])
+                newEnv = callee.methodEnv(receiver, vals, env)
+                body, obj = callee.expr, None
+            elif isinstance(callee, Closure):
+                newEnv = callee.callEnv(vals, env)
+                body, obj = callee.expr, None
+                memo = callee.memo
+                if memo is not None:
+                    key = memo.key(vals)
+                    if key is not None:
+                        value = memo.get(key)
+                        if value is not NOT_CACHED:
+                            push(value)
+                            continue
+                        # The call returns to a frame that caches its result before returning it here
+                        frames.append((code, pc, env, stack, constructing))
+                        code, ops, args, pc, stack, constructing = MEMOIZE, MEMOIZE.ops, MEMOIZE.args, 0, [(memo, key)], None
+                        push, pop = stack.append, stack.pop
+            elif type(callee) == Builtin:
+                push(callee.function(*vals))
+                continue
+            elif callee.constructor:
+                newEnv = callee.constructorEnv([callee] + vals, env)
+                body, obj = callee.constructorClosure().expr, callee
+            else:
+                push(callee)
+                continue
+            if type(body) != Code:
+                value, newEnv = body.eval(newEnv)
+                if obj is not None:
+                    obj.adopt(newEnv['this'])
+                    value = obj
+                push(value)
+                continue
+            frames.append((code, pc, env, stack, constructing))
+            code, ops, args, pc, env, stack, constructing = body, body.ops, body.args, 0, newEnv, [], obj
+            push, pop = stack.append, stack.pop
+        elif op == RETURN:
+            value = pop()
+            if constructing is not None:
+                constructing.adopt(env['this'])
+                value = constructing
+            if not frames:
+                return value
+            code, pc, env, stack, constructing = frames.pop()
+            ops, args = code.ops, code.args
+            push, pop = stack.append, stack.pop
+            push(value)
+        elif op == INDEX:
+            ind = pop()
+            obj = stack[-1]
+            assert type(obj) in INDEXABLE, 'Can only index a string or list'
+            stack[-1] = obj[ind]
+        elif op == SLICE:
+            end = pop() if arg & END else None
+            start = pop() if arg & START else None
+            obj = stack[-1]
+            assert type(obj) in SLICEABLE, 'Not a sliceable item'
+            assert (type(start) == int or start is None) and (type(end) == int or end is None), "Slice indices must be integers"
+            stack[-1] = obj[start:end]
+        elif op == STORE_ATTR:
+            newval = pop()
+            pop()[arg] = newval
+        elif op == STORE_INDEX:
+            newval, ind = pop(), pop()
+            pop()[ind] = newval
+        elif op == STORE_SLICE:
+            newval, obj = pop(), pop()
+            end = pop() if arg & END else None
+            start = pop() if arg & START else None
+            obj[start:end] = newval
+        elif op == WRAP_ACCESS:
+            stack[-1] = stack[-1], arg
+        elif op == BUILD_LIST:
+            push(popAll(stack, arg))
+        elif op == COPY_CONST:
+            push(arg.copy())
+        elif op == STORE_MEMO:
+            value = pop()
+            memo, key = pop()
+            memo.store(key, value)
+            push(value)
+        elif op == BUILD_TUPLE:
+            push(tuple(popAll(stack, arg)))
+        elif op == BUILD_DICT:
+            items = popAll(stack, 2 * arg)
+            push({k: v for k, v in zip(items[::2], items[1::2])})
+        elif op == MAKE_FUNCTION:
+            push(makeFunction(arg, env))
+        elif op == MAKE_CLASS:
+            push(makeClass(arg, env))
+        elif op == GET_ITER:
+            stack[-1] = iterate(stack[-1])
+        elif op == PRINT:
+            print(stack[-1])
+        elif op == TEST:
+            assert pop(), f'Test expression {arg.exp} evaluated to false!'
+        elif op == INPUT:
+            push(int(input(">")))
+        else:
+            raise ValueError(f"Unknown opcode {op}")
+
+
+def popAll(stack, n):
+    """
+    Pops the top n values off stack, returning them in the order they were pushed
+    """
+    if n == 0:
+        return []
+    items = stack[-n:]
+    del stack[-n:]
+    return items
+
+
+def prepareMethod(node, stack):
+    """
+    Checks the function and receiver on top of stack can be called by the App node, before its arguments are evaluated
+    """
+    if stack[-1] is None:
+        stack.pop()
+        prepareCall(node, stack)
+    elif len(stack[-2].args) != len(node.args) + 1:
+        raise TypeError("Number of arguments does not match number of parameters")
+
+
+def prepareCall(node, stack):
+    """
+    Checks the function on top of stack can be called by the App node, before its arguments are evaluated,
+    and pushes the object it is a method of (None if it is not a method)
+
+    A class is replaced by the new object its constructor will be called on
+    """
+    clos = stack[-1]
+    if isinstance(clos, tuple):
+        clos, _ = clos
+        stack[-1] = clos
+    receiver = None
+    if isinstance(clos, Closure):
+        if isinstance(clos, MethodClosure):
+            receiver = clos.obj
+        if len(clos.args) != len(node.args) + (receiver is not None):
+            raise TypeError("Number of arguments does not match number of parameters")
+    elif isinstance(clos, ClassInfo):
+        obj = Object(clos)
+        if not obj.constructor:
+            if len(node.args) > 0:
+                raise TypeError("Constructor takes no arguments")
+        elif len(obj.constructorClosure().args) != len(node.args) + 1:
+            raise TypeError("Invalid number of arguments for constructor call")
+        stack[-1] = obj
+    elif type(clos) != Builtin:
+        raise NotAFunction(node.func)
+    stack.append(receiver)
+
+
+def makeFunction(arg, env):
+    node, body = arg
+    if not isinstance(node, Function):
+        return Closure(body, node.args, capture(env, node.capturedNames()))
+    clos = node.closure(body, capture(env, node.capturedNames()))
+    binding = (clos, node.access) if isinstance(node, AccessFunction) else clos
+    clos.env[node.name.name] = binding
+    env[node.name.name] = binding
+    return clos
+
+
+def makeClass(arg, env):
+    node, members = arg
+    superClass = env[node.superClass.name] if node.superClass is not None else None
+    classVars, methods = {}, {}
+    for isMethod, member in members:
+        # Members are evaluated on their own, just like Class.destructBody
+        memberEnv = {}
+        execute(member, memberEnv)
+        (methods if isMethod else classVars).update(memberEnv)
+    classInfo = ClassInfo(node.name.name, classVars, methods, superClass, capture(env, node.capturedNames()))
+    env[node.name.name] = classInfo
+    return classInfo
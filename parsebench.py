@@ -0,0 +1,71 @@
+"""
+Measures how many tokens per second each parser gets through
+
+The corpus is every program in the repository, parsed as it is and then
+repeated into one large program, so both short and long inputs are timed.
+"""
+import argparse
+import glob
+import os
+import time
+import oomphlex
+import oomphparse
+import oomphpratt
+from main import PARSERS
+
+
+def corpus():
+    """
+    Returns the text of every .oomph file in the repository
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    files = sorted(glob.glob(os.path.join(here, 'tests', '**', '*.oomph'), recursive=True))
+    files += sorted(glob.glob(os.path.join(here, '*.oomph')))
+    progs = []
+    for filename in files:
+        with open(filename) as file:
+            progs.append(file.read())
+    return progs
+
+
+def tokens(prog):
+    return len(oomphpratt.tokenize(prog)[0]) - 1
+
+
+def bench(parse, progs, seconds):
+    """
+    Returns the best tokens per second of parse over progs, repeating them for at least seconds
+    """
+    count = sum(tokens(prog) for prog in progs)
+    best = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        start = time.perf_counter()
+        for prog in progs:
+            parse(prog)
+        best = max(best, count / (time.perf_counter() - start))
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the speed of the OOMPH parsers')
+    parser.add_argument('--seconds', action="store", dest="seconds", type=float, default=1,
+                        help="How long to time each parser on each input")
+    parser.add_argument('--copies', action="store", dest="copies", type=int, default=50,
+                        help="How many times the corpus is repeated in the large program")
+    args = parser.parse_args()
+
+    # Build the PLY tables before timing anything
+    oomphlex.getLexer()
+    oomphparse.getParser()
+    progs = corpus()
+    large = ';\n'.join(f'({prog})' for prog in progs * args.copies)
+    inputs = [('corpus', progs), ('large', [large])]
+    print(f"{'':>8}" + ''.join(f"{name:>22}" for name, _ in inputs))
+    for name, parse in PARSERS.items():
+        rates = [bench(parse, progs, args.seconds) for _, progs in inputs]
+        print(f"{name:>8}" + ''.join(f"{rate:>14,.0f} tokens/s" for rate in rates))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,9 @@
-from ply import lex, yacc
-import oomphlex
-import oomphparse
+import argparse
 import ast
+from main import PARSERS
 
 
-def main():
-    lexer = lex.lex(module=oomphlex)
-    parser = yacc.yacc(module=oomphparse)
+def main(parse=PARSERS['ply']):
     env = {}
     while True:
         text = input("> ")
@@ -15,7 +12,7 @@ def main():
         if text == "env()":
             print(env)
             continue
-        result = parser.parse(text)
+        result = parse(text)
         try:
             v, env = result.eval(env)
             print(">> " + str(v))
@@ -29,4 +26,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Evaluate OOMPH interactively')
+    parser.add_argument('--parser', action="store", dest="parser", choices=PARSERS, default='ply',
+                        help="The parser to read input with")
+    main(PARSERS[parser.parse_args().parser])
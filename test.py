@@ -1,5 +1,25 @@
 import os
+import sys
+import io
+import json
+import time
+import argparse
+import contextlib
+import tempfile
+import multiprocessing
+import multiprocessing.connection
+import xml.etree.ElementTree as ElementTree
 import oomphparse
+import oomphpratt
+import oomphoptimize
+import oomphnum
+from main import ENGINES, PARSERS
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows, where peak memory is not reported
+    resource = None
 
 
 def red(skk): return "\033[91m {}\033[00m" .format(skk)
@@ -8,26 +28,300 @@ def red(skk): return "\033[91m {}\033[00m" .format(skk)
 def green(skk): return "\033[92m {}\033[00m" .format(skk)
 
 
-def test():
-    testDir = os.path.join(os.getcwd(), 'tests')
+def findTests(testDir=None):
+    testDir = testDir or os.path.join(os.getcwd(), 'tests')
     tests = []
     for r, d, f in os.walk(testDir):
         for file in f:
             if '.oomph' in file:
                 tests.append(os.path.join(r, file))
     tests.sort()
+    return testDir, tests
+
+
+def peakMemory():
+    """
+    Returns the most memory this process has used so far in MB, or None if it can't be told
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and macOS bytes
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def runTest(filename, engine, parser, optimize, conn):
+    """
+    Runs the test in filename and sends its result through conn
+
+    Runs in a process of its own, so no test sees what another one left behind.
+    """
+    output = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with open(filename) as testFile:
+            prog = testFile.read()
+        with contextlib.redirect_stdout(output):
+            tree = PARSERS[parser](prog)
+            if optimize:
+                tree = oomphoptimize.optimize(tree)
+            ENGINES[engine](tree, {})
+        status, error = 'ok', None
+    except Exception as e:
+        status, error = 'failed', repr(e)
+    conn.send({'status': status, 'error': error, 'seconds': time.perf_counter() - start,
+               'peakMB': peakMemory(), 'output': output.getvalue()})
+    conn.close()
+
+
+def test(engine='tree', parser='ply', optimize=False, jobs=None, timeout=60, testDir=None, quiet=False):
+    """
+    Runs every test, each in a process of its own with up to jobs at once, printing results in order
+
+    Returns a list with a dictionary for each test holding its name, its status
+    ('ok', 'failed', 'timeout' or 'crashed'), its error, the seconds it took,
+    the most memory it used in MB, and what it printed
+
+    Parameter timeout: how many seconds a test may run for before it is stopped
+    Parameter testDir: the directory to find the tests in, tests in the current directory by default
+    Parameter quiet: whether to leave out printing the results
+    """
+    testDir, tests = findTests(testDir)
+    jobs = jobs or os.cpu_count() or 1
+    context = multiprocessing.get_context()
+    todo = list(enumerate(tests))
+    running = {}
+    # {sentinel: what the test sent}, received as soon as it is sent, since a large result
+    # fills the pipe and the test can not exit until it has been read
+    received = {}
+    results = [None] * len(tests)
+    shown = 0
+    while todo or running:
+        while todo and len(running) < jobs:
+            i, filename = todo.pop(0)
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=runTest, args=(filename, engine, parser, optimize, sender), daemon=True)
+            process.start()
+            sender.close()
+            running[process.sentinel] = (i, process, receiver, time.perf_counter())
+        nearest = min(started for _, _, _, started in running.values()) + timeout
+        receivers = [receiver for sentinel, (_, _, receiver, _) in running.items() if sentinel not in received]
+        ready = multiprocessing.connection.wait(list(running) + receivers, max(0, nearest - time.perf_counter()))
+        for sentinel, (i, process, receiver, started) in list(running.items()):
+            if receiver in ready and sentinel not in received:
+                try:
+                    received[sentinel] = receiver.recv()
+                except EOFError:
+                    # The test exited without sending anything
+                    received[sentinel] = None
+            if process.exitcode is not None and sentinel not in received:
+                # The test may have sent its result and exited after wait returned
+                received[sentinel] = drain(receiver)
+            elapsed = time.perf_counter() - started
+            if sentinel in received and received[sentinel] is not None:
+                result = received.pop(sentinel)
+            elif process.exitcode is None and elapsed < timeout:
+                continue
+            elif process.exitcode is None:
+                process.kill()
+                result = {'status': 'timeout', 'error': f'took longer than {timeout} seconds'}
+            else:
+                result = {'status': 'crashed', 'error': f'exited with code {process.exitcode}'}
+            received.pop(sentinel, None)
+            process.join()
+            receiver.close()
+            del running[sentinel]
+            result.setdefault('seconds', elapsed)
+            result.setdefault('peakMB', None)
+            result.setdefault('output', '')
+            result['test'] = tests[i].replace(testDir + '/', '')
+            results[i] = result
+        while shown < len(results) and results[shown] is not None:
+            if not quiet:
+                report(results[shown])
+            shown += 1
+    return results
+
+
+def drain(receiver):
+    """
+    Returns what a test that has exited sent through receiver, or None if it sent nothing
+    """
+    try:
+        return receiver.recv() if receiver.poll() else None
+    except EOFError:
+        return None
+
+
+def checkRunner(rounds, jobs=None):
+    """
+    Runs a batch of tests that exit at once, rounds times, and returns how many of them were not reported as passing
+
+    Tests finishing together are where results sent just before a test exits can be lost.
+    """
+    failures = 0
+    with tempfile.TemporaryDirectory() as testDir:
+        for n in range(4 * (jobs or os.cpu_count() or 1)):
+            with open(os.path.join(testDir, f'quick{n:03}.oomph'), 'w') as file:
+                file.write(f'test({n} = {n})')
+        for _ in range(rounds):
+            for result in test(jobs=jobs, testDir=testDir, quiet=True):
+                if result['status'] != 'ok':
+                    failures += 1
+                    print(f"{result['test']}:" + red(f"NOT OK: {result['error']}"))
+    return failures
+
+
+# Array programs whose results are at the edge of 64 bits, with what each gives or the error it raises
+ARRAY_CHECKS = [
+    ('sum(array([4611686018427387904]) - 1 + 4611686018427387904)', 2 ** 63 - 1),
+    ('sum(array([4611686018427387904]) * 2)', OverflowError),
+    ('sum(array([0 - 4611686018427387904]) * 2)', -2 ** 63),
+    ('sum(array([0 - 4611686018427387904]) * 2 - 1)', OverflowError),
+    ('sum(0 - array([0 - 4611686018427387904]) * 2)', OverflowError),
+    ('sum(array([3037000499]) * array([3037000499]))', 3037000499 ** 2),
+    ('sum(3037000500 * array([3037000500]))', OverflowError),
+    ('sum(array([1, 2]) + 9223372036854775807)', OverflowError),
+    ('sum(array([9223372036854775807, 9223372036854775807]))', 2 ** 64 - 2),
+    ('a := array([1]); a[0] := 9223372036854775807 + 1', OverflowError),
+]
+
+
+def checkArrays():
+    """
+    Runs ARRAY_CHECKS with NumPy, if it is installed, and without it, and returns how many did not give what they should
+    """
+    failures = 0
+    for useNumpy in [True, False] if oomphnum.importNumpy() is not None else [False]:
+        oomphnum.USE_NUMPY = useNumpy
+        backend = 'numpy' if useNumpy else 'array.array'
+        for prog, expected in ARRAY_CHECKS:
+            try:
+                result = ENGINES['tree'](PARSERS['ply'](prog), {})[0]
+            except OverflowError:
+                result = OverflowError
+            if result == expected:
+                print(f"{backend} {prog}: " + green('OK'))
+            else:
+                failures += 1
+                print(f"{backend} {prog}:" + red(f"NOT OK: gave {result}, not {expected}"))
+    oomphnum.USE_NUMPY = True
+    return failures
+
+
+def report(result):
+    memory = f", {result['peakMB']:.1f} MB" if result['peakMB'] is not None else ""
+    timing = f" ({result['seconds']:.3f}s{memory})"
+    if result['status'] == 'ok':
+        print(f"{result['test']}: " + green('OK') + timing)
+    else:
+        print(f"{result['test']}:" + red(f"NOT OK: {result['error']}") + timing)
+        if result['output']:
+            print(result['output'], end='' if result['output'].endswith('\n') else '\n')
+
+
+def printSlowest(results, n):
+    print(f"\nSlowest {min(n, len(results))} tests:")
+    for result in sorted(results, key=lambda result: result['seconds'], reverse=True)[:n]:
+        memory = f"{result['peakMB']:8.1f} MB" if result['peakMB'] is not None else ""
+        print(f"{result['seconds']:8.3f}s {memory}  {result['test']}")
+
+
+def writeJson(results, filename, settings):
+    with open(filename, 'w') as file:
+        json.dump({**settings, 'tests': results}, file, indent=2)
+
+
+def writeJunit(results, filename, settings):
+    """
+    Writes results as JUnit XML, the format most CI servers read
+    """
+    failures = sum(result['status'] == 'failed' for result in results)
+    suite = ElementTree.Element('testsuite', {
+        'name': 'oomph.' + settings['engine'],
+        'tests': str(len(results)),
+        'failures': str(failures),
+        'errors': str(sum(result['status'] != 'ok' for result in results) - failures),
+        'time': f"{sum(result['seconds'] for result in results):.3f}",
+    })
+    properties = ElementTree.SubElement(suite, 'properties')
+    for name, value in settings.items():
+        ElementTree.SubElement(properties, 'property', {'name': name, 'value': str(value)})
+    for result in results:
+        directory, name = os.path.split(result['test'])
+        case = ElementTree.SubElement(suite, 'testcase', {
+            'classname': directory.replace(os.sep, '.') or 'tests',
+            'name': name,
+            'time': f"{result['seconds']:.3f}",
+        })
+        if result['status'] != 'ok':
+            problem = ElementTree.SubElement(case, 'failure' if result['status'] == 'failed' else 'error',
+                                             {'message': result['error'], 'type': result['status']})
+            problem.text = result['output']
+        elif result['output']:
+            ElementTree.SubElement(case, 'system-out').text = result['output']
+    ElementTree.ElementTree(suite).write(filename, encoding='unicode', xml_declaration=True)
+
+
+def compareParsers():
+    """
+    Checks that the PLY and hand written parsers give the same tree for every test
 
+    Returns whether they agreed on all of them
+    """
+    testDir, tests = findTests()
+    agreed = True
     for filename in tests:
         with open(os.path.join(testDir, filename)) as testFile:
             prog = testFile.read()
         relative_file = filename.replace(testDir + '/', '')
-        try:
-            tree = oomphparse.parser.parse(prog)
-            _ = tree.eval({})
-            print(f'{relative_file}: ' + green('OK'))
-        except Exception as e:
-            print(f'{relative_file}:' + red(f'NOT OK: {repr(e)}'))
+        if oomphpratt.sameTree(oomphparse.parse(prog), oomphpratt.parse(prog)):
+            print(f'{relative_file}: ' + green('SAME'))
+        else:
+            print(f'{relative_file}:' + red('NOT OK: the parsers disagree'))
+            agreed = False
+    return agreed
 
 
 if __name__ == "__main__":
-    test()
+    parser = argparse.ArgumentParser(description='Run every .oomph file in the tests directory')
+    parser.add_argument('--engine', action="store", dest="engine", choices=ENGINES, default='tree',
+                        help="The engine to run the tests with")
+    parser.add_argument('--parser', action="store", dest="parser", choices=PARSERS, default='ply',
+                        help="The parser to read the tests with")
+    parser.add_argument('-O', action="store_true", dest="optimize",
+                        help="Optimize the tests before running them")
+    parser.add_argument('-j', '--jobs', action="store", dest="jobs", type=int, default=None,
+                        help="How many tests to run at once (default: one per CPU)")
+    parser.add_argument('--timeout', action="store", dest="timeout", type=float, default=60,
+                        help="Stop a test that runs for longer than this many seconds (default %(default)s)")
+    parser.add_argument('--slowest', action="store", dest="slowest", type=int, default=0, metavar='N',
+                        help="Finish with the N slowest tests, with how long they took and the memory they used")
+    parser.add_argument('--json', action="store", dest="json", metavar='FILE',
+                        help="Also write the results to FILE as JSON")
+    parser.add_argument('--junit', action="store", dest="junit", metavar='FILE',
+                        help="Also write the results to FILE as JUnit XML")
+    parser.add_argument('--compare-parsers', action="store_true", dest="compareParsers",
+                        help="Check that both parsers read every test the same way instead of running them")
+    parser.add_argument('--check-runner', action="store", dest="checkRunner", type=int, default=0, metavar='ROUNDS',
+                        help="Check the runner itself, running a batch of quick tests ROUNDS times, instead of the tests")
+    parser.add_argument('--check-arrays', action="store_true", dest="checkArrays",
+                        help="Check that arrays give the same results at the edge of 64 bits with NumPy and without it, "
+                             "instead of running the tests")
+    args = parser.parse_args()
+    if args.checkArrays:
+        sys.exit(checkArrays() != 0)
+    if args.checkRunner:
+        sys.exit(checkRunner(args.checkRunner, args.jobs) != 0)
+    if args.compareParsers:
+        sys.exit(not compareParsers())
+    else:
+        results = test(args.engine, args.parser, args.optimize, args.jobs, args.timeout)
+        settings = {'engine': args.engine, 'parser': args.parser, 'optimize': args.optimize}
+        if args.slowest:
+            printSlowest(results, args.slowest)
+        if args.json:
+            writeJson(results, args.json, settings)
+        if args.junit:
+            writeJunit(results, args.junit, settings)
+        sys.exit(any(result['status'] != 'ok' for result in results))